@@ -0,0 +1,1303 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import threading
+import warnings
+from collections import deque
+from functools import partial
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from cache import AnalysisCache, DEFAULT_CACHE_SIZE, analysis_key
+from checkpoint import Checkpoint, default_checkpoint_dir
+from roi import parse_regions
+from series import TimeSeries
+from spectral import spectral_layer_count
+
+
+DEFAULT_STRIDE = 4
+DEFAULT_SAMPLING = 'stride'
+SAMPLING_MODES = ('stride', 'rate', 'seek', 'adaptive')
+ADAPTIVE_MAX_STRIDE = 32
+ADAPTIVE_CHANGE = 0.05
+THUMBNAIL_SIZE = (32, 32)
+UNEVEN_STEP_RATIO = 1.5
+DOWNSCALES = (1, 2, 4, 8)
+MAX_UPSAMPLING = 4
+DEFAULT_LATTICE_CONSTANT = 3.5
+DEFAULT_WORKERS = 0
+DEFAULT_SEGMENTS = 1
+EXPORT_CHUNK = 65536
+IMPORT_CHUNK = 1 << 20
+CSV_HEADER = 'Time (s),Intensity'
+TOP_PIXELS = 100
+BACKGROUND_PERCENTILES = (10, 90)
+ESTIMATORS = ('zero-crossing', 'spectral')
+DEFAULT_ESTIMATOR = 'zero-crossing'
+
+_LEVELS = np.arange(256, dtype=np.float64)
+_scratch = threading.local()
+
+
+def scratch_buffer(name, shape, dtype=np.uint8):
+    # per-thread working arrays kept from one frame to the next, so the metric allocates nothing frame-sized
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = buffers[name] = np.empty(shape, dtype)
+    return buffer
+
+
+def frame_brightness_reference(gray):
+    # a view where the image is contiguous; argpartition below does not modify it
+    flat_image = gray.ravel()
+    top_100_indices = np.argpartition(flat_image, -TOP_PIXELS)[-TOP_PIXELS:]
+    top_intensity = np.mean(flat_image[top_100_indices])
+
+    p10 = np.percentile(flat_image, BACKGROUND_PERCENTILES[0])
+    p90 = np.percentile(flat_image, BACKGROUND_PERCENTILES[1])
+    background_mask = (flat_image >= p10) & (flat_image <= p90)
+    background_intensity = np.mean(flat_image[background_mask])
+
+    return top_intensity / background_intensity if background_intensity > 0 else 1.0
+
+
+def gray_histogram(gray, mask=None):
+    if not gray.size:
+        return np.zeros(256, dtype=np.int64)
+    # calcHist counts in float32, which is only exact below 2**24 pixels per bin
+    if gray.size < 2**24:
+        hist = cv2.calcHist([gray], [0], mask, [256], [0, 256], hist=scratch_buffer('hist', (256, 1), np.float32))
+        return hist.ravel().astype(np.int64)
+    pixels = gray.ravel() if mask is None else gray[mask.astype(bool)]
+    return np.bincount(pixels, minlength=256).astype(np.int64)
+
+
+def brightness_from_histogram(hist):
+    counts = np.concatenate(([0], np.cumsum(hist)))
+    weighted = np.concatenate(([0.0], np.cumsum(hist * _LEVELS)))
+    n = int(counts[-1])
+    if n < TOP_PIXELS:
+        return 1.0
+
+    def value_at(rank):
+        return int(np.searchsorted(counts, rank, side='right')) - 1
+
+    def percentile(q):
+        position = q / 100 * (n - 1)
+        lower = int(np.floor(position))
+        fraction = position - lower
+        below = value_at(lower)
+        above = value_at(min(lower + 1, n - 1))
+        return below + (above - below) * fraction
+
+    threshold = value_at(n - TOP_PIXELS)
+    n_above = n - counts[threshold + 1]
+    sum_above = weighted[-1] - weighted[threshold + 1]
+    top_intensity = (sum_above + (TOP_PIXELS - n_above) * threshold) / TOP_PIXELS
+
+    low = int(np.ceil(percentile(BACKGROUND_PERCENTILES[0])))
+    high = int(np.floor(percentile(BACKGROUND_PERCENTILES[1])))
+    background_count = counts[high + 1] - counts[low]
+    if background_count <= 0:
+        return 1.0
+    background_intensity = (weighted[high + 1] - weighted[low]) / background_count
+
+    return top_intensity / background_intensity if background_intensity > 0 else 1.0
+
+
+def brightness_from_histograms(hists):
+    # brightness_from_histogram for one histogram per row, with the same arithmetic so results match exactly
+    hists = np.atleast_2d(hists)
+    rows = np.arange(len(hists))
+    counts = np.zeros((len(hists), 257), dtype=np.int64)
+    counts[:, 1:] = np.cumsum(hists, axis=1)
+    weighted = np.zeros((len(hists), 257))
+    weighted[:, 1:] = np.cumsum(hists * _LEVELS, axis=1)
+    n = counts[:, -1]
+
+    def value_at(rank):
+        return np.sum(counts <= rank[:, None], axis=1) - 1
+
+    def percentile(q):
+        position = q / 100 * (n - 1)
+        lower = np.floor(position).astype(np.int64)
+        fraction = position - lower
+        below = value_at(lower)
+        above = value_at(np.minimum(lower + 1, n - 1))
+        return below + (above - below) * fraction
+
+    threshold = value_at(n - TOP_PIXELS)
+    n_above = n - counts[rows, threshold + 1]
+    sum_above = weighted[:, -1] - weighted[rows, threshold + 1]
+    top_intensity = (sum_above + (TOP_PIXELS - n_above) * threshold) / TOP_PIXELS
+
+    low = np.clip(np.ceil(percentile(BACKGROUND_PERCENTILES[0])).astype(np.int64), 0, 255)
+    high = np.clip(np.floor(percentile(BACKGROUND_PERCENTILES[1])).astype(np.int64), -1, 255)
+    background_count = counts[rows, high + 1] - counts[rows, low]
+    background_sum = weighted[rows, high + 1] - weighted[rows, low]
+
+    valid = (n >= TOP_PIXELS) & (background_count > 0) & (background_sum > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        background_intensity = background_sum / background_count
+        return np.where(valid, top_intensity / background_intensity, 1.0)
+
+
+def frame_brightness(gray):
+    if gray.dtype != np.uint8:
+        return frame_brightness_reference(gray)
+    return brightness_from_histogram(gray_histogram(gray))
+
+
+def to_gray(frame, out=None):
+    # `out` is reused when it has the frame's size, as OpenCV does with any dst
+    if len(frame.shape) == 3 and frame.size:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=out)
+    return frame
+
+
+MIN_OSCILLATION_SAMPLES = 20
+SMOOTHING_WINDOW = 21
+SMOOTHING_POLYORDER = 3
+MIN_CROSSING_SEPARATION = 10
+
+
+def filter_crossings(zero_crossings, count=0, last_crossing=-MIN_CROSSING_SEPARATION):
+    for crossing in zero_crossings:
+        if crossing - last_crossing >= MIN_CROSSING_SEPARATION:
+            count += 1
+            last_crossing = crossing
+    return count, last_crossing
+
+
+def count_rheed_oscillations(brightness_values, time_points):
+    # scipy.signal takes longer to import than the GUI needs for its first paint, so it is loaded on first use
+    from scipy import signal
+    from scipy.signal import savgol_filter
+
+    if len(brightness_values) < MIN_OSCILLATION_SAMPLES:
+        return 0
+
+    detrended = signal.detrend(brightness_values, type='linear')
+
+    window_length = min(SMOOTHING_WINDOW, len(detrended)//4)
+    if window_length % 2 == 0:
+        window_length += 1
+    if window_length < 5:
+        window_length = 5
+
+    smoothed = savgol_filter(detrended, window_length=window_length, polyorder=SMOOTHING_POLYORDER)
+
+    sign_changes = np.diff(np.sign(smoothed))
+    zero_crossings = np.where(sign_changes != 0)[0]
+
+    filtered_count, _ = filter_crossings(zero_crossings)
+    return filtered_count // 2
+
+
+def even_series(brightness_values, time_points):
+    # both estimators work in samples, not seconds, so a run with uneven gaps (adaptive sampling) is
+    # interpolated onto its finest spacing first, as if every sample had been taken at the highest rate;
+    # evenly sampled runs, including live runs with the odd dropped frame, are returned as they are
+    if time_points is None or len(time_points) < 3:
+        return brightness_values, time_points
+    time_points = np.asarray(time_points, dtype=np.float64)
+    steps = np.diff(time_points)
+    fine, coarse = np.percentile(steps, (5, 95))
+    if fine <= 0 or coarse <= fine * UNEVEN_STEP_RATIO:
+        return brightness_values, time_points
+    # a few bunched-up timestamps (capture jitter) must not make the grid much finer than the sampling
+    step = max(float(np.min(steps[steps > 0])), fine / MAX_UPSAMPLING)
+    even_times = np.arange(time_points[0], time_points[-1] + step / 2, step)
+    return np.interp(even_times, time_points, brightness_values), even_times
+
+
+def count_layers(brightness_values, time_points, estimator=DEFAULT_ESTIMATOR):
+    # zero-crossing counts whole oscillations; spectral gives a fractional count from the dominant frequency
+    brightness_values, time_points = even_series(brightness_values, time_points)
+    if estimator == 'spectral':
+        return spectral_layer_count(brightness_values, time_points)
+    return count_rheed_oscillations(brightness_values, time_points)
+
+
+def format_layers(peak_count):
+    return f"{peak_count:.2f}" if isinstance(peak_count, float) else str(peak_count)
+
+
+def _smoothing_projection(window_length=SMOOTHING_WINDOW, polyorder=SMOOTHING_POLYORDER):
+    x = np.arange(window_length) - window_length // 2
+    vander = np.vander(x, polyorder + 1)
+    return vander @ np.linalg.pinv(vander)
+
+
+class StreamingOscillationCounter:
+    # Savitzky-Golay filtering commutes with removing a straight line, so the filter runs once per sample on the
+    # raw values and only the least-squares trend (kept as running sums) has to be subtracted when counting.
+    # Crossings are committed against the trend from the last full recount, which happens every time the run
+    # grows by 1/resync_fraction, so per-sample work is amortized O(1). exact_count() matches
+    # count_rheed_oscillations on the same data. Timestamps are accepted, and ignored, so it can stand in for
+    # spectral.SlidingSpectrum.
+    def __init__(self, capacity=1024, resync_fraction=32):
+        self.resync_fraction = resync_fraction
+        self.n = 0
+        self.count = 0
+        self._values = np.empty(capacity)
+        self._smoothed = np.empty(capacity)
+        self._sum_y = 0.0
+        self._sum_iy = 0.0
+        self._projection = _smoothing_projection()
+        self._half = SMOOTHING_WINDOW // 2
+        self._warmup = 4 * (SMOOTHING_WINDOW - 1)
+        self._synced_at = 0
+        self._line = (0.0, 0.0)
+        self._last_sign = 0.0
+        self._committed = (0, -MIN_CROSSING_SEPARATION)
+
+    def __len__(self):
+        return self.n
+
+    def reset(self):
+        self.__init__(len(self._values), self.resync_fraction)
+
+    def extend(self, values, time_points=None):
+        for value in values:
+            self.update(value)
+        return self.count
+
+    def update(self, value, time_point=None):
+        if self.n == len(self._values):
+            self._values = np.concatenate((self._values, np.empty(len(self._values))))
+            self._smoothed = np.concatenate((self._smoothed, np.empty(len(self._smoothed))))
+
+        i = self.n
+        self._values[i] = value
+        self._sum_y += value
+        self._sum_iy += i * value
+        self.n += 1
+        n = self.n
+
+        if n < self._warmup:
+            # the batch smoothing window still depends on the run length here
+            self.count = count_rheed_oscillations(self._values[:n], None)
+            return self.count
+
+        if n == self._warmup:
+            from scipy.signal import savgol_filter
+            self._smoothed[:n] = savgol_filter(self._values[:n], window_length=SMOOTHING_WINDOW,
+                                               polyorder=SMOOTHING_POLYORDER)
+            return self._resync()
+
+        half = self._half
+        window = self._values[n - SMOOTHING_WINDOW:n]
+        self._smoothed[n - half - 1] = self._projection[half] @ window
+        self._smoothed[n - half:n] = self._projection[half + 1:] @ window
+
+        if n - self._synced_at >= max(1, self._synced_at // self.resync_fraction):
+            return self._resync()
+
+        a, b = self._line
+        j = n - half - 1
+        sign = np.sign(self._smoothed[j] - a - b * j)
+        if sign != self._last_sign:
+            self._committed = filter_crossings((j - 1,), *self._committed)
+        self._last_sign = sign
+
+        self.count = self._tail_count(j)
+        return self.count
+
+    def exact_count(self):
+        if self.n < self._warmup:
+            return self.count
+        if self._synced_at != self.n:
+            self._resync()
+        return self.count
+
+    def _trend(self):
+        n = self.n
+        sum_i = n * (n - 1) / 2
+        sum_ii = (n - 1) * n * (2 * n - 1) / 6
+        denominator = n * sum_ii - sum_i * sum_i
+        b = (n * self._sum_iy - sum_i * self._sum_y) / denominator if denominator else 0.0
+        a = (self._sum_y - b * sum_i) / n
+        return a, b
+
+    def _resync(self):
+        n = self.n
+        a, b = self._trend()
+        signs = np.sign(self._smoothed[:n] - (a + b * np.arange(n)))
+        zero_crossings = np.where(np.diff(signs) != 0)[0]
+
+        # crossings past this point involve smoothed values that still move as samples arrive
+        last_settled = n - self._half - 1
+        settled = zero_crossings[zero_crossings < last_settled]
+        self._committed = filter_crossings(settled)
+        self._last_sign = signs[last_settled]
+        self._line = (a, b)
+        self._synced_at = n
+
+        self.count = self._tail_count(last_settled)
+        return self.count
+
+    def _tail_count(self, last_settled):
+        a, b = self._line
+        index = np.arange(last_settled, self.n)
+        signs = np.sign(self._smoothed[last_settled:self.n] - (a + b * index))
+        tail_crossings = np.where(np.diff(signs) != 0)[0] + last_settled
+        filtered_count, _ = filter_crossings(tail_crossings, *self._committed)
+        return filtered_count // 2
+
+
+class ResampledCounter:
+    # Stands in for a streaming counter on an adaptively sampled stream: the counter is fed samples `step`
+    # seconds apart, interpolated across the gaps, as if the whole run had been sampled at the highest rate
+    def __init__(self, counter, step):
+        self.counter = counter
+        self.step = step
+        self.count = 0
+        self._last = None
+        self._next_time = None
+
+    def __len__(self):
+        return len(self.counter)
+
+    @property
+    def frequency(self):
+        return getattr(self.counter, 'frequency', None)
+
+    def extend(self, values, time_points=None):
+        for i, value in enumerate(values):
+            self.update(value, None if time_points is None else time_points[i])
+        return self.count
+
+    def update(self, value, time_point=None):
+        if time_point is None:
+            self.count = self.counter.update(value)
+        else:
+            self._advance(time_point, value)
+        return self.count
+
+    def _advance(self, time_point, value):
+        if self._last is None:
+            self._next_time = time_point
+            self._last = (time_point, value)
+        last_time, last_value = self._last
+        while self._next_time <= time_point:
+            span = time_point - last_time
+            fraction = (self._next_time - last_time) / span if span > 0 else 1.0
+            self.count = self.counter.update(last_value + (value - last_value) * fraction, self._next_time)
+            self._next_time += self.step
+        self._last = (time_point, value)
+
+
+def series_duration(time_points):
+    return float(np.max(time_points)) if len(time_points) else 0
+
+
+def growth_summary(duration_s, peak_count, lattice_constant):
+    total_time_hrs = duration_s / 3600 if duration_s else 0
+    thickness_nm = (peak_count * lattice_constant) / 10
+    growth_rate = thickness_nm / total_time_hrs if total_time_hrs > 0 else 0
+    return thickness_nm, growth_rate
+
+
+def region_brightness(frame, regions):
+    # crop before converting to gray so high-resolution frames only pay for the pixels inside the regions
+    crops = []
+    for i, region in enumerate(regions):
+        crop = region.crop(frame)
+        crops.append(to_gray(crop, scratch_buffer(('region', i), crop.shape[:2], frame.dtype)))
+    if any(crop.dtype != np.uint8 for crop in crops):
+        masks = [region.mask_for(crop) for region, crop in zip(regions, crops)]
+        return np.array([frame_brightness_reference(crop if mask is None else crop[mask.astype(bool)])
+                         for crop, mask in zip(crops, masks)])
+
+    hists = np.empty((len(regions), 256), dtype=np.int64)
+    for i, (region, crop) in enumerate(zip(regions, crops)):
+        hists[i] = gray_histogram(crop, region.mask_for(crop))
+    return brightness_from_histograms(hists)
+
+
+def frame_metric(frame, regions=None):
+    if regions:
+        return region_brightness(frame, regions)
+    return frame_brightness(to_gray(frame, scratch_buffer('gray', frame.shape[:2], frame.dtype)))
+
+
+def seek_frame(cap, frame_index):
+    if frame_index <= 0:
+        return True
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+        return True
+
+    # the backend could not seek exactly, so walk there from the start without decoding
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(frame_index):
+        if not cap.grab():
+            return False
+    return True
+
+
+class FrameSampler:
+    def __init__(self, mode=DEFAULT_SAMPLING, stride=DEFAULT_STRIDE, rate=None, max_stride=ADAPTIVE_MAX_STRIDE,
+                 change=ADAPTIVE_CHANGE, gray=False, downscale=1):
+        if mode not in SAMPLING_MODES:
+            raise ValueError(f"unknown sampling mode {mode!r}, expected one of {SAMPLING_MODES}")
+        if mode in ('rate', 'seek') and not rate:
+            raise ValueError(f"sampling mode {mode!r} needs a sample rate")
+        if downscale not in DOWNSCALES:
+            raise ValueError(f"downscale must be one of {DOWNSCALES}")
+        self.mode = mode
+        self.stride = max(1, int(stride))
+        self.rate = rate
+        # adaptive sampling moves between every `stride`-th and every `max_stride`-th frame
+        self.max_stride = max(self.stride, int(max_stride))
+        self.change = change
+        # how sampled frames are delivered: grayscale and/or shrunk by `downscale`, by the decoder where it can
+        self.gray = gray
+        self.downscale = downscale
+
+    @property
+    def seeks(self):
+        return self.mode == 'seek'
+
+    @property
+    def sequential(self):
+        # adaptive steps depend on every frame sampled before, so such a run is neither split into segments
+        # nor resumed partway, either of which would sample different frames from a single pass
+        return self.mode == 'adaptive'
+
+    def interval(self, fps):
+        if self.mode in ('stride', 'adaptive'):
+            return self.stride
+        if not fps or self.rate >= fps:
+            return 1
+        return max(1, round(fps / self.rate))
+
+    def wants(self, frame_index, fps):
+        if self.mode == 'rate':
+            # sample the first frame of every 1/rate second bucket so the rate holds for fractional fps ratios
+            if not fps or self.rate >= fps or frame_index == 0:
+                return True
+            return int(frame_index * self.rate / fps) != int((frame_index - 1) * self.rate / fps)
+        return frame_index % self.interval(fps) == 0
+
+    def schedule(self):
+        # the sampling state for one pass over a video or stream; only adaptive sampling has any
+        if self.mode == 'adaptive':
+            return AdaptiveSchedule(self.stride, self.max_stride, self.change)
+        return self
+
+    def observe(self, frame_index, frame):
+        pass
+
+    def __repr__(self):
+        if self.mode == 'stride':
+            text = f"FrameSampler('stride', stride={self.stride}"
+        elif self.mode == 'adaptive':
+            text = f"FrameSampler('adaptive', stride={self.stride}, max_stride={self.max_stride}, change={self.change}"
+        else:
+            text = f"FrameSampler({self.mode!r}, rate={self.rate}"
+        if self.gray:
+            text += ", gray=True"
+        if self.downscale > 1:
+            text += f", downscale={self.downscale}"
+        return text + ")"
+
+
+def thumbnail(frame):
+    # area averaging also averages away most of the sensor noise
+    small = cv2.resize(frame, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return to_gray(small).astype(np.float32)
+
+
+class AdaptiveSchedule:
+    # Change-driven sampling. Every sampled frame is shrunk to a thumbnail and compared with the previous one:
+    # if some part of the pattern moved by more than `change` of full scale since then, the stride shrinks in
+    # proportion; while nothing moved by a quarter of that, it doubles. Long idle stretches are sampled every
+    # max_stride frames and oscillations at up to every min_stride-th frame.
+    def __init__(self, min_stride, max_stride, change):
+        self.min_stride = min_stride
+        self.max_stride = max_stride
+        self.change = change
+        self.stride = min_stride
+        self.next_index = 0
+        self._last = None
+
+    def wants(self, frame_index, fps=None):
+        return frame_index >= self.next_index
+
+    def observe(self, frame_index, frame):
+        current = thumbnail(frame)
+        if self._last is not None:
+            moved = float(np.max(np.abs(current - self._last))) / 255
+            if moved > self.change:
+                self.stride = max(self.min_stride, min(self.stride // 2, int(self.stride * self.change / moved)))
+            elif moved < self.change / 4:
+                self.stride = min(self.max_stride, self.stride * 2)
+        self._last = current
+        self.next_index = frame_index + self.stride
+
+
+class BufferRing:
+    # A fixed set of image buffers handed out in turn for OpenCV to write into. A buffer comes round again
+    # `count` frames later, so `count` must exceed the frames that can be in flight at once; count=0 hands
+    # out nothing and OpenCV allocates as usual.
+    def __init__(self, count):
+        self.count = count
+        self._buffers = [None] * count
+        self._next = 0
+
+    def current(self):
+        return self._buffers[self._next] if self.count else None
+
+    def commit(self, buffer):
+        # OpenCV returns the buffer it was given, or a new one if the frame size changed; either is kept
+        if self.count:
+            self._buffers[self._next] = buffer
+            self._next = (self._next + 1) % self.count
+
+
+class BufferPool:
+    # Buffers lent to another thread, which gives each one back with release() once nothing reads it any
+    # more. Unlike BufferRing a buffer is never written while it is out: when all `count` are lent,
+    # `available` is False and the frame has to be dropped instead.
+    def __init__(self, count):
+        self.count = count
+        self._free = [None] * count
+        self._reserved = []
+        self._lent = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return bool(self._free or self._reserved)
+
+    def current(self):
+        # the buffer is held back until commit(), so a release in between cannot hand it out twice; None
+        # until OpenCV has allocated it, and when none is free
+        with self._lock:
+            if not self._reserved and self._free:
+                self._reserved.append(self._free.pop())
+            return self._reserved[0] if self._reserved else None
+
+    def commit(self, buffer):
+        with self._lock:
+            # without a reserved buffer the frame went into a fresh array, which nothing needs to give back
+            if self._reserved:
+                self._reserved.clear()
+                self._lent[id(buffer)] = buffer
+
+    def release(self, buffer):
+        # anything not lent from here, such as a frame the decoder allocated, is ignored
+        with self._lock:
+            if buffer is not None and self._lent.pop(id(buffer), None) is not None:
+                self._free.append(buffer)
+
+
+def fourcc_name(cap):
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return ''.join(chr((code >> shift) & 0xFF) for shift in (0, 8, 16, 24))
+
+
+class FrameReader:
+    # Retrieves sampled frames into reused buffers rather than a new array per frame. `buffers` is how many
+    # delivered frames may be alive at once (None: allocate every frame, for callers that keep them), or a
+    # BufferPool when they are handed to another thread. Only the last stage delivers; the stages before it
+    # write into a single buffer each.
+    #
+    # With sampler.gray or sampler.downscale, MJPEG sources are read as compressed packets and decoded
+    # straight to (reduced) grayscale or color, so grab() no longer decodes at all and skipped frames cost
+    # almost nothing. MJPEG cameras are read the same way on V4L2. Any other source is converted and shrunk
+    # after decoding.
+    def __init__(self, cap, sampler=None, buffers=None):
+        sampler = sampler or FrameSampler()
+        self.cap = cap
+        self.gray = sampler.gray
+        self.downscale = sampler.downscale
+        self.raw = False
+        if (self.gray or self.downscale > 1) and fourcc_name(cap) == 'MJPG':
+            backend = cap.getBackendName()
+            if backend == 'FFMPEG':
+                self.raw = cap.set(cv2.CAP_PROP_FORMAT, -1)
+            elif backend == 'V4L2':
+                self.raw = cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+
+        # a BufferPool for frames handed to another thread, which releases them; otherwise a count to reuse
+        # in turn
+        shrink = self.downscale > 1
+        delivered = buffers if isinstance(buffers, BufferPool) else BufferRing(buffers or 0)
+        self.frames = delivered if not (self.gray or shrink) else BufferRing(1)
+        self.grays = delivered if self.gray and not shrink else BufferRing(1)
+        self.shrunk = delivered if shrink else BufferRing(1)
+        self.delivered = None
+
+        flags = (cv2.IMREAD_GRAYSCALE, cv2.IMREAD_REDUCED_GRAYSCALE_2, cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                 cv2.IMREAD_REDUCED_GRAYSCALE_8) if self.gray else (
+                 cv2.IMREAD_COLOR, cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_COLOR_4,
+                 cv2.IMREAD_REDUCED_COLOR_8)
+        self.decode_flags = flags[DOWNSCALES.index(self.downscale)]
+
+    def retrieve(self):
+        ret, frame = self.cap.retrieve(self.frames.current())
+        if not ret or frame is None or not frame.size:
+            return None
+        self.frames.commit(frame)
+        self.delivered = self.frames
+        if self.raw:
+            frame = self._decode_raw(frame)
+            if frame is None:
+                return None
+
+        if self.gray and frame.ndim == 3:
+            frame = to_gray(frame, self.grays.current())
+            self.grays.commit(frame)
+            self.delivered = self.grays
+        if self.downscale > 1 and self.delivered is not None:
+            # decoder output is already reduced; everything else is shrunk here
+            h, w = frame.shape[:2]
+            frame = cv2.resize(frame, (w // self.downscale, h // self.downscale), dst=self.shrunk.current(),
+                               interpolation=cv2.INTER_AREA)
+            self.shrunk.commit(frame)
+            self.delivered = self.shrunk
+        return frame
+
+    def _decode_raw(self, frame):
+        if frame.ndim == 2 and frame.shape[0] == 1:
+            # a compressed packet; imdecode cannot write into a given buffer, so this output is allocated
+            self.delivered = None
+            return cv2.imdecode(frame, self.decode_flags)
+        return frame
+
+
+def sampled_frames(cap, sampler=None, progress=None, start=0, end=None, buffers=None):
+    sampler = sampler or FrameSampler()
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    span = (end if end is not None else total_frames) - start
+    reader = FrameReader(cap, sampler, buffers)
+
+    if sampler.seeks:
+        yield from _seek_frames(cap, reader, sampler.interval(fps), progress, start, end, total_frames, span)
+        return
+
+    schedule = sampler.schedule()
+    frame_count = start
+
+    while end is None or frame_count < end:
+        # grab() decodes without the BGR conversion and copy that retrieve() does, so skipped frames stay cheap
+        if not cap.grab():
+            break
+
+        if schedule.wants(frame_count, fps):
+            frame = reader.retrieve()
+            if frame is not None:
+                schedule.observe(frame_count, frame)
+                yield frame_count, frame
+
+        frame_count += 1
+
+        if progress and span > 0 and (frame_count - start) % max(1, span // 100) == 0:
+            progress(int(((frame_count - start) / span) * 100))
+
+
+def _seek_frames(cap, reader, interval, progress, start, end, total_frames, span):
+    last = end if end is not None else (total_frames if total_frames > 0 else None)
+    frame_index = -(-start // interval) * interval
+
+    while last is None or frame_index < last:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        frame = reader.retrieve() if cap.grab() else None
+        if frame is None:
+            break
+
+        yield frame_index, frame
+        frame_index += interval
+
+        if progress and span > 0:
+            progress(int(((min(frame_index, start + span) - start) / span) * 100))
+
+
+def pipelined_map(func, items, workers, queue_depth=None):
+    queue_depth = max(1, queue_depth or 2 * workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for key, item in items:
+            if len(pending) >= queue_depth:
+                done_key, future = pending.popleft()
+                yield done_key, future.result()
+            pending.append((key, pool.submit(func, item)))
+        while pending:
+            done_key, future = pending.popleft()
+            yield done_key, future.result()
+
+
+def frames_in_flight(workers, queue_depth=None):
+    # decoded frames alive at once: the one being measured, or those queued for the workers plus the next
+    if workers <= 0:
+        return 2
+    return max(1, queue_depth or 2 * workers) + 2
+
+
+def measure_frames(frames, workers=DEFAULT_WORKERS, queue_depth=None, regions=None, perf=None):
+    metric = partial(frame_metric, regions=regions) if regions else frame_metric
+    if perf is not None:
+        metric = perf.timed('metric', metric)
+    if workers > 0:
+        return pipelined_map(metric, frames, workers, queue_depth)
+    return ((frame_index, metric(frame)) for frame_index, frame in frames)
+
+
+def analyze_video(video_path, progress=None, sampler=None, workers=DEFAULT_WORKERS, queue_depth=None,
+                  segments=DEFAULT_SEGMENTS, on_sample=None, regions=None, start=0, stop=None, perf=None):
+    if segments > 1 and not start and not (sampler and sampler.sequential):
+        result = analyze_video_segments(video_path, segments, progress, sampler, workers, queue_depth, regions)
+        if result is not None and on_sample:
+            for time_point, brightness in zip(*result):
+                on_sample(time_point, brightness)
+        return result
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    series = TimeSeries(columns=len(regions) if regions else None)
+    if start and not seek_frame(cap, start):
+        cap.release()
+        return series.times, series.values
+
+    if start and progress and total_frames > start:
+        # report progress through the whole video, not just the part left after resuming
+        report = progress
+
+        def progress(percent):
+            report(round((start + percent / 100 * (total_frames - start)) / total_frames * 100))
+
+    frames = sampled_frames(cap, sampler, progress, start, buffers=frames_in_flight(workers, queue_depth))
+    if perf is not None:
+        frames = perf.timed_iter('decode', frames)
+    for frame_index, brightness in measure_frames(frames, workers, queue_depth, regions, perf):
+        if stop is not None and stop.is_set():
+            cap.release()
+            return None
+        series.append(frame_index / fps, brightness)
+        if on_sample:
+            on_sample(frame_index / fps, brightness)
+
+    cap.release()
+    return series.times, series.values
+
+
+def video_fps(video_path):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else None
+    cap.release()
+    return fps or None
+
+
+def checkpointed_analyze_video(video_path, checkpoint, on_sample=None, on_resume=None, **analysis_options):
+    # measured samples are appended to the checkpoint as they arrive; if it already holds the start of this
+    # analysis, only the frames after its last sample are decoded and the two parts are joined
+    regions = analysis_options.get('regions')
+    sampler = analysis_options.get('sampler')
+    previous = None if sampler and sampler.sequential else checkpoint.load()
+    start = 0
+    if previous is not None:
+        fps = video_fps(video_path)
+        if fps is None:
+            return None
+        start = int(round(previous[0][-1] * fps)) + 1
+        if on_resume:
+            on_resume(*previous)
+
+    def record(time_point, brightness):
+        checkpoint.append(time_point, brightness)
+        if on_sample:
+            on_sample(time_point, brightness)
+
+    checkpoint.start(video_path, len(regions) if regions else None, resume=previous is not None)
+    try:
+        result = analyze_video(video_path, on_sample=record, start=start, **analysis_options)
+    finally:
+        checkpoint.close()
+    if result is None:
+        return None
+
+    checkpoint.discard()
+    if previous is None:
+        return result
+    return np.concatenate((previous[0], result[0])), np.concatenate((previous[1], result[1]))
+
+
+def analysis_parameters(sampler=None, regions=None):
+    # everything besides the video itself that changes the series; workers and segments do not, since
+    # sequential (adaptive) sampling ignores segments
+    sampler = sampler or FrameSampler()
+    return {
+        'sampling': [sampler.mode, sampler.stride, sampler.rate] + (
+            [sampler.max_stride, sampler.change] if sampler.mode == 'adaptive' else []) + (
+            [sampler.gray, sampler.downscale] if sampler.gray or sampler.downscale > 1 else []),
+        'top_pixels': TOP_PIXELS,
+        'background_percentiles': list(BACKGROUND_PERCENTILES),
+        'regions': [str(region) for region in regions or []]
+    }
+
+
+def cached_analyze_video(video_path, cache=None, checkpoint_dir=None, **analysis_options):
+    if cache is None and checkpoint_dir is None:
+        return analyze_video(video_path, **analysis_options)
+
+    try:
+        key = analysis_key(video_path, analysis_parameters(analysis_options.get('sampler'),
+                                                           analysis_options.get('regions')))
+    except OSError:
+        return analyze_video(video_path, **analysis_options)
+
+    result = cache.get(key) if cache is not None else None
+    if result is not None:
+        return result
+
+    if checkpoint_dir is not None:
+        result = checkpointed_analyze_video(video_path, Checkpoint(key, checkpoint_dir), **analysis_options)
+    else:
+        result = analyze_video(video_path, **analysis_options)
+    if result is not None and cache is not None:
+        # the cache only saves time later; failing to write it does not fail the analysis
+        try:
+            cache.put(key, *result, source=video_path)
+        except OSError as e:
+            print(f"Error caching analysis of {video_path}: {e}")
+    return result
+
+
+def segment_bounds(total_frames, segments, stride=DEFAULT_STRIDE):
+    # segment starts are multiples of the stride so every segment samples the same frames a single pass would
+    length = -(-total_frames // segments)
+    length = -(-length // stride) * stride
+    bounds = [(start, start + length) for start in range(0, total_frames, length)]
+    bounds[-1] = (bounds[-1][0], None)
+    return bounds
+
+
+_segment_progress = None
+
+
+def _init_segment_worker(progress_queue):
+    global _segment_progress
+    _init_worker()
+    _segment_progress = progress_queue
+
+
+def analyze_segment(video_path, segment_id, start, end, sampler=None, workers=DEFAULT_WORKERS, queue_depth=None,
+                    regions=None):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"could not open {video_path}")
+
+    def report(percent):
+        if _segment_progress is not None:
+            _segment_progress.put((segment_id, percent))
+
+    frame_indices = []
+    brightness_values = []
+    if seek_frame(cap, start):
+        frames = sampled_frames(cap, sampler, report, start, end, frames_in_flight(workers, queue_depth))
+        for frame_index, brightness in measure_frames(frames, workers, queue_depth, regions):
+            frame_indices.append(frame_index)
+            brightness_values.append(brightness)
+
+    cap.release()
+    report(100)
+    return frame_indices, brightness_values
+
+
+def analyze_video_segments(video_path, segments, progress=None, sampler=None, workers=DEFAULT_WORKERS,
+                           queue_depth=None, regions=None):
+    sampler = sampler or FrameSampler()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    stride = sampler.interval(fps)
+    if total_frames < 2 * stride:
+        return analyze_video(video_path, progress, sampler, workers, queue_depth, regions=regions)
+
+    bounds = segment_bounds(total_frames, segments, stride)
+    weights = [((end if end is not None else total_frames) - start) / total_frames for start, end in bounds]
+    segment_percent = [0] * len(bounds)
+    last_reported = -1
+
+    progress_queue = multiprocessing.Queue()
+    with ProcessPoolExecutor(max_workers=len(bounds), initializer=_init_segment_worker,
+                             initargs=(progress_queue,)) as pool:
+        futures = [pool.submit(analyze_segment, video_path, i, start, end, sampler, workers, queue_depth, regions)
+                   for i, (start, end) in enumerate(bounds)]
+
+        while not all(f.done() for f in futures) or not progress_queue.empty():
+            try:
+                segment_id, percent = progress_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            segment_percent[segment_id] = percent
+            overall = round(sum(p * w for p, w in zip(segment_percent, weights)))
+            if progress and overall != last_reported:
+                progress(overall)
+                last_reported = overall
+
+        results = [f.result() for f in futures]
+
+    frame_indices = np.concatenate([np.asarray(indices, dtype=np.float64) for indices, _ in results])
+    shape = (-1, len(regions)) if regions else (-1,)
+    brightness_values = np.concatenate([np.asarray(values, dtype=np.float64).reshape(shape) for _, values in results])
+    return frame_indices / fps, brightness_values
+
+
+def export_series(file_path, time_points, brightness_values, peak_count, lattice_constant, regions=None):
+    time_points = np.asarray(time_points, dtype=np.float64)
+    brightness_values = np.asarray(brightness_values, dtype=np.float64)
+    # 2-D values hold one column per region; the first region is the one layers are counted on
+    region_values = brightness_values if brightness_values.ndim == 2 else brightness_values[:, None]
+    names = [getattr(region, 'name', region) for region in regions or []]
+    if brightness_values.ndim == 2 and len(names) != region_values.shape[1]:
+        names = [f"Region {i + 1}" for i in range(region_values.shape[1])]
+    thickness_nm, growth_rate = growth_summary(series_duration(time_points), peak_count, lattice_constant)
+
+    if file_path.endswith('.json'):
+        summary = {
+            'peak_count': peak_count,
+            'lattice_constant': lattice_constant,
+            'thickness_nm': thickness_nm,
+            'growth_rate_nm_per_hr': growth_rate
+        }
+        with open(file_path, 'w') as f:
+            f.write('{"time_points":')
+            _write_json_array(f, time_points)
+            f.write(',"brightness_values":')
+            _write_json_array(f, region_values[:, 0])
+            if names:
+                f.write(',"region_names":' + json.dumps(names, separators=(',', ':')))
+                if all(hasattr(region, 'to_dict') for region in regions):
+                    definitions = [region.to_dict() for region in regions]
+                    f.write(',"regions":' + json.dumps(definitions, separators=(',', ':')))
+                f.write(',"region_values":{')
+                for i, name in enumerate(names):
+                    f.write((',' if i else '') + json.dumps(name) + ':')
+                    _write_json_array(f, region_values[:, i])
+                f.write('}')
+            f.write(',' + json.dumps(summary, separators=(',', ':'))[1:])
+    else:
+        header = ['Time (s)'] + names if names else CSV_HEADER.split(',')
+        row_format = ','.join(['%r'] * len(header)) + '\r\n'
+        with open(file_path, 'w', newline='') as f:
+            f.write(','.join(header) + '\r\n')
+            for start in range(0, len(time_points), EXPORT_CHUNK):
+                rows = np.column_stack((time_points[start:start + EXPORT_CHUNK],
+                                        region_values[start:start + EXPORT_CHUNK]))
+                # one %-format call per chunk; %r keeps the shortest round-trip repr csv.writer produced
+                f.write((row_format * len(rows)) % tuple(rows.ravel().tolist()))
+
+
+def _write_json_array(f, values):
+    f.write('[')
+    for start in range(0, len(values), EXPORT_CHUNK):
+        if start:
+            f.write(',')
+        f.write(json.dumps(values[start:start + EXPORT_CHUNK].tolist(), separators=(',', ':'))[1:-1])
+    f.write(']')
+
+
+def import_series(file_path, chunk_size=IMPORT_CHUNK):
+    with open(file_path, 'r', newline='') as f:
+        if file_path.endswith('.csv'):
+            return _read_csv_series(f, chunk_size)
+        data = _JsonStream(f, chunk_size).read_object()
+
+    if 'region_values' in data:
+        names = data.get('region_names') or list(data['region_values'])
+        data['region_names'] = names
+        data['region_values'] = np.column_stack([data['region_values'][name] for name in names])
+    return data
+
+
+def _read_csv_series(f, chunk_size):
+    names = None
+    first = f.readline()
+    try:
+        pending = [np.loadtxt([first], delimiter=',', ndmin=2)]
+    except ValueError:
+        names = [name.strip() for name in first.strip().split(',')[1:]]
+        pending = []
+
+    series = None
+    rows_per_chunk = max(1, chunk_size // 32)
+    while True:
+        if not pending:
+            lines = list(islice(f, rows_per_chunk))
+            if not lines:
+                break
+            if not any(line.strip() for line in lines):
+                continue
+            pending.append(np.loadtxt(lines, delimiter=',', ndmin=2))
+        rows = pending.pop()
+        if series is None:
+            series = TimeSeries(columns=rows.shape[1] - 1 if rows.shape[1] > 2 else None)
+        series.extend(rows[:, 0], rows[:, 1:] if series.columns else rows[:, 1])
+
+    if series is None:
+        series = TimeSeries(columns=len(names) if names and len(names) > 1 else None)
+    data = {'time_points': series.times, 'brightness_values': series.column(0)}
+    if series.columns:
+        if not names or len(names) != series.columns:
+            names = [f"Region {i + 1}" for i in range(series.columns)]
+        data['region_names'] = names
+        data['region_values'] = series.values
+    return data
+
+
+_JSON_KEY = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*:\s*')
+
+
+def _parse_numbers(text):
+    if not text.strip():
+        return np.empty(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            values = np.fromstring(text, sep=',')
+        except (DeprecationWarning, ValueError):
+            raise ValueError("JSON arrays must contain only numbers")
+    if len(values) != text.count(',') + 1:
+        raise ValueError("JSON arrays must contain only numbers")
+    return values
+
+
+class _JsonStream:
+    # a small pull parser for the layout export_series writes: numeric arrays go straight from text chunks
+    # to float64 without building Python lists, anything else is handed to the json module
+    def __init__(self, f, chunk_size=IMPORT_CHUNK):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ''
+        self.decoder = json.JSONDecoder()
+
+    def read_more(self):
+        more = self.f.read(self.chunk_size)
+        self.text += more
+        return bool(more)
+
+    def peek(self):
+        while len(self.text) < 4096 and self.read_more():
+            pass
+        self.text = self.text.lstrip()
+        return self.text[:1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"malformed JSON, expected {char!r}")
+        self.text = self.text[1:]
+
+    def read_object(self):
+        data = {}
+        self.expect('{')
+        if self.peek() == '}':
+            self.text = self.text[1:]
+            return data
+
+        while True:
+            self.peek()
+            match = _JSON_KEY.match(self.text)
+            if not match:
+                raise ValueError("malformed JSON object")
+            key = json.loads(f'"{match.group(1)}"')
+            self.text = self.text[match.end():]
+            data[key] = self.read_value()
+
+            if self.peek() != ',':
+                self.expect('}')
+                return data
+            self.text = self.text[1:]
+
+    def read_value(self):
+        first = self.peek()
+        if first == '{':
+            return self.read_object()
+        if first == '[' and self.text[1:].lstrip()[:1] not in ('"', '{', '['):
+            return self.read_numbers()
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text)
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+                continue
+            self.text = self.text[end:]
+            return value
+
+    def read_numbers(self):
+        self.expect('[')
+        parts = []
+        while True:
+            end = self.text.find(']')
+            if end >= 0:
+                parts.append(_parse_numbers(self.text[:end]))
+                self.text = self.text[end + 1:]
+                return np.concatenate(parts)
+            cut = self.text.rfind(',')
+            if cut >= 0:
+                parts.append(_parse_numbers(self.text[:cut]))
+                self.text = self.text[cut + 1:]
+            if not self.read_more():
+                raise ValueError("unterminated JSON array")
+
+
+def output_path_for(video_path, output_dir, fmt):
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    directory = output_dir if output_dir else os.path.dirname(os.path.abspath(video_path))
+    return os.path.join(directory, f"{stem}.{fmt}")
+
+
+def _init_worker():
+    cv2.setNumThreads(1)
+
+
+def analyze_to_file(video_path, output_path, lattice_constant=DEFAULT_LATTICE_CONSTANT, cache=None,
+                    checkpoint_dir=None, estimator=DEFAULT_ESTIMATOR, **analysis_options):
+    result = cached_analyze_video(video_path, cache, checkpoint_dir, **analysis_options)
+    if result is None:
+        raise IOError(f"could not open {video_path}")
+
+    time_points, brightness_values = result
+    primary = brightness_values if brightness_values.ndim == 1 else brightness_values[:, 0]
+    peak_count = count_layers(primary, time_points, estimator)
+    export_series(output_path, time_points, brightness_values, peak_count, lattice_constant,
+                  analysis_options.get('regions'))
+
+    thickness_nm, growth_rate = growth_summary(series_duration(time_points), peak_count, lattice_constant)
+    return {
+        'video': video_path,
+        'output': output_path,
+        'samples': len(time_points),
+        'peak_count': peak_count,
+        'thickness_nm': thickness_nm,
+        'growth_rate_nm_per_hr': growth_rate
+    }
+
+
+def run_batch(video_paths, output_dir=None, fmt='json', jobs=None, lattice_constant=DEFAULT_LATTICE_CONSTANT, **analysis_options):
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    from tqdm import tqdm
+
+    jobs = jobs or os.cpu_count() or 1
+    results = []
+    failures = []
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+        futures = {
+            pool.submit(analyze_to_file, path, output_path_for(path, output_dir, fmt), lattice_constant,
+                        **analysis_options): path
+            for path in video_paths
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), unit='video'):
+            path = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failures.append((path, e))
+                tqdm.write(f"Error analyzing {path}: {e}")
+
+    return results, failures
+
+
+def build_parser(prog='gandiva.py analyze'):
+    parser = argparse.ArgumentParser(prog=prog, description='Analyze RHEED videos without the GUI.')
+    parser.add_argument('videos', nargs='+', help='video files to analyze')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', help='export format')
+    parser.add_argument('--output-dir', '-o', default=None, help='directory for exports (default: next to each video)')
+    parser.add_argument('--lattice-constant', type=float, default=DEFAULT_LATTICE_CONSTANT, help='lattice constant in Å')
+    parser.add_argument('--sampling', choices=SAMPLING_MODES, default=DEFAULT_SAMPLING,
+                        help='stride: every Nth frame; rate: a fixed number of samples per second; '
+                             'seek: jump straight to one frame per 1/rate seconds (quick look); adaptive: '
+                             'sample more often while the pattern changes and less while it is static')
+    parser.add_argument('--stride', type=int, default=DEFAULT_STRIDE,
+                        help='analyze every Nth frame (stride sampling; the highest rate for adaptive sampling)')
+    parser.add_argument('--max-stride', type=int, default=ADAPTIVE_MAX_STRIDE,
+                        help='the lowest rate for adaptive sampling, as every Nth frame')
+    parser.add_argument('--change', type=float, default=ADAPTIVE_CHANGE,
+                        help='adaptive sampling: the largest change between samples, as a fraction of full scale')
+    parser.add_argument('--sample-rate', type=float, default=None, help='samples per second (rate and seek sampling)')
+    parser.add_argument('--gray', action='store_true',
+                        help='decode straight to grayscale; MJPEG videos then skip color decoding and conversion')
+    parser.add_argument('--downscale', type=int, choices=DOWNSCALES, default=1,
+                        help='measure frames shrunk by this factor, decoded at that size where the codec allows')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='metric threads per video, fed by a separate decode thread (0: decode and compute serially)')
+    parser.add_argument('--queue-depth', type=int, default=None,
+                        help='decoded frames allowed in flight per video (default: 2 x workers)')
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS,
+                        help='split each video into N frame ranges analyzed in separate processes '
+                             '(ignored with --sampling adaptive)')
+    parser.add_argument('--roi', action='append', default=[], metavar='NAME=X,Y,W,H',
+                        help='measure a region instead of the whole frame; repeat for more regions, layers are '
+                             'counted on the first. Polygons are given as NAME=X1,Y1;X2,Y2;X3,Y3...')
+    parser.add_argument('--resume', action='store_true',
+                        help='checkpoint progress so an interrupted analysis continues where it stopped when rerun '
+                             '(ignored with --segments and --sampling adaptive)')
+    parser.add_argument('--no-cache', action='store_true', help='always re-analyze, ignoring cached results')
+    parser.add_argument('--cache-dir', default=None, help='result cache directory (default: ~/.gandiva/cache)')
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_CACHE_SIZE / 2**20,
+                        help='cache size cap in MB; least recently used results are evicted first')
+    parser.add_argument('--estimator', choices=ESTIMATORS, default=DEFAULT_ESTIMATOR,
+                        help='zero-crossing: count whole oscillations; spectral: fractional layers from the '
+                             'dominant oscillation frequency')
+    return parser
+
+
+def main(argv=None, prog='gandiva.py analyze'):
+    parser = build_parser(prog)
+    args = parser.parse_args(argv)
+    try:
+        sampler = FrameSampler(args.sampling, args.stride, args.sample_rate, args.max_stride, args.change,
+                               args.gray, args.downscale)
+        regions = parse_regions('\n'.join(args.roi)) or None
+        if regions and args.downscale > 1:
+            raise ValueError("--downscale cannot be combined with --roi, whose coordinates are in full-size pixels")
+    except ValueError as e:
+        parser.error(str(e))
+
+    results, failures = run_batch(args.videos, args.output_dir, args.format, args.jobs,
+                                  args.lattice_constant, sampler=sampler,
+                                  workers=args.workers, queue_depth=args.queue_depth,
+                                  segments=args.segments, regions=regions,
+                                  cache=None if args.no_cache else AnalysisCache(args.cache_dir, args.cache_size * 2**20),
+                                  checkpoint_dir=default_checkpoint_dir() if args.resume else None,
+                                  estimator=args.estimator)
+
+    for r in sorted(results, key=lambda r: r['video']):
+        print(f"{r['video']}: Layers: {format_layers(r['peak_count'])} | Thickness: {r['thickness_nm']:.2f} nm | "
+              f"Rate: {r['growth_rate_nm_per_hr']:.1f} nm/hr -> {r['output']}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(prog='analysis.py'))
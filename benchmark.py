@@ -0,0 +1,910 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from analysis import (frame_brightness, frame_brightness_reference, to_gray, count_rheed_oscillations, count_layers,
+                      StreamingOscillationCounter, export_series, import_series, frame_metric, analyze_video,
+                      BufferPool, FrameReader, FrameSampler)
+from capture import CaptureThread, FrameRing, DROP_OLDEST
+from lod import SmoothedPyramid, smooth
+from publisher import SamplePublisher, FRAMINGS, parse_address, subscribe
+from roi import Region
+from series import TimeSeries
+from spectral import SlidingSpectrum, frequency_track, spectral_layer_count
+
+
+KERNEL_RESOLUTIONS = [(480, 640), (1080, 1920), (2160, 3840)]
+SUITE_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+SUITE_STAGES = ('decode', 'grayscale', 'metric', 'count', 'plot')
+REPORT_VERSION = 1
+STARTUP_TARGET_S = 2.0
+# a publish() that waited on a socket would take as long as the stalled subscriber does, seconds here; the
+# reader threads share the interpreter, so a few milliseconds of scheduling noise are normal
+PUBLISH_MAX_MS = 50.0
+
+# run in a fresh interpreter: import the GUI module, then build and paint the main window, without the splash
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import gandiva
+imported = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+window = gandiva.RHEED()
+window.show()
+app.processEvents()
+ready = time.perf_counter()
+print(json.dumps({'import_s': imported - start, 'window_s': ready - imported, 'deferred': sorted(
+    name for name in gandiva.DEFERRED_MODULES if name in sys.modules)}))
+window.close()
+'''
+
+
+def synthetic_frames(shape, count, seed=0):
+    rng = np.random.default_rng(seed)
+    h, w = shape
+    yy, xx = np.mgrid[:h, :w]
+    spot = np.exp(-((xx - w / 2) ** 2 + (yy - h / 2) ** 2) / (0.0005 * h * w))
+    frames = []
+    for i in range(count):
+        amplitude = 0.6 + 0.4 * np.cos(2 * np.pi * i / max(1, count))
+        img = 40 + 30 * rng.random((h, w)) + 180 * amplitude * spot
+        frames.append(np.clip(img, 0, 255).astype(np.uint8))
+    return frames
+
+
+def video_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(to_gray(frame))
+    cap.release()
+    return frames
+
+
+def time_per_frame(func, frames, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for gray in frames:
+            func(gray)
+        best = min(best, (time.perf_counter() - start) / len(frames))
+    return best
+
+
+def check_frame_kernel(frames, rtol=1e-9):
+    reference = np.array([frame_brightness_reference(g) for g in frames])
+    kernel = np.array([frame_brightness(g) for g in frames])
+    max_rel_error = float(np.max(np.abs(kernel - reference) / np.abs(reference)))
+
+    reference_time = time_per_frame(frame_brightness_reference, frames)
+    kernel_time = time_per_frame(frame_brightness, frames)
+
+    return {
+        'shape': frames[0].shape,
+        'frames': len(frames),
+        'max_rel_error': max_rel_error,
+        'matches': max_rel_error <= rtol,
+        'reference_ms': reference_time * 1000,
+        'kernel_ms': kernel_time * 1000,
+        'speedup': reference_time / kernel_time if kernel_time > 0 else float('inf')
+    }
+
+
+def print_kernel_row(label, r):
+    print(f"{label:>24}  {r['reference_ms']:9.3f} ms  {r['kernel_ms']:9.3f} ms  "
+          f"{r['speedup']:7.1f}x  max rel err {r['max_rel_error']:.2e}  {'OK' if r['matches'] else 'MISMATCH'}")
+
+
+def run_kernel_check(videos=(), frames=20):
+    print(f"{'frames':>24}  {'reference':>12}  {'histogram':>12}  {'speedup':>8}")
+    results = []
+    for shape in KERNEL_RESOLUTIONS:
+        r = check_frame_kernel(synthetic_frames(shape, frames))
+        print_kernel_row(f"synthetic {shape[1]}x{shape[0]}", r)
+        results.append(r)
+    for path in videos:
+        sample = video_frames(path, frames)
+        if not sample:
+            print(f"Error reading {path}")
+            continue
+        r = check_frame_kernel(sample)
+        print_kernel_row(path, r)
+        results.append(r)
+    return results
+
+
+def synthetic_series(n, period, noise, drift=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    return 2 + 0.5 * np.cos(2 * np.pi * t / period) + rng.normal(0, noise, n) + drift * t
+
+
+def check_streaming_counter(series_count=8, check_every=5, seed=0):
+    rng = np.random.default_rng(seed)
+    checks = mismatches = live_differences = 0
+    for k in range(series_count):
+        n = int(rng.integers(200, 3000))
+        values = synthetic_series(n, rng.uniform(30, 200), rng.uniform(0.05, 0.6), rng.uniform(-1e-3, 1e-3), seed + k)
+        counter = StreamingOscillationCounter(capacity=16)
+        for i, value in enumerate(values):
+            counter.update(value)
+            if i % check_every and i != n - 1:
+                continue
+            expected = count_rheed_oscillations(values[:i + 1], None)
+            checks += 1
+            live_differences += counter.count != expected
+            mismatches += counter.exact_count() != expected
+
+    values = synthetic_series(100000, 150, 0.2, seed=seed)
+    counter = StreamingOscillationCounter()
+    start = time.perf_counter()
+    counter.extend(values)
+    streaming_us = (time.perf_counter() - start) / len(values) * 1e6
+    start = time.perf_counter()
+    count_rheed_oscillations(values, None)
+    batch_us = (time.perf_counter() - start) * 1e6
+
+    return {
+        'checks': checks,
+        'exact_mismatches': mismatches,
+        'live_differences': live_differences,
+        'streaming_us_per_sample': streaming_us,
+        'batch_us_per_sample_at_100k': batch_us
+    }
+
+
+def chirp_series(n, start_period, end_period, noise, seed=0):
+    # oscillation whose period changes linearly over the run, as when the growth rate drifts
+    rng = np.random.default_rng(seed)
+    period = np.linspace(start_period, end_period, n)
+    phase = 2 * np.pi * np.cumsum(1 / period)
+    return 2 + 0.5 * np.cos(phase) + rng.normal(0, noise, n), 1 / period
+
+
+def check_spectral(trials=40, seed=0):
+    # layer counts against the known (fractional) number of periods; the zero-crossing count can only be
+    # whole, so some of its error is truncation
+    rng = np.random.default_rng(seed)
+    errors = {'zero-crossing': [], 'spectral': [], 'sliding': []}
+    for k in range(trials):
+        period = rng.uniform(30, 200)
+        n = int(period * rng.uniform(3, 40))
+        values = synthetic_series(n, period, rng.uniform(0.05, 0.6), rng.uniform(-1e-3, 1e-3), seed + k)
+        layers = n / period
+        errors['zero-crossing'].append(abs(count_rheed_oscillations(values, None) - layers))
+        errors['spectral'].append(abs(spectral_layer_count(values) - layers))
+        errors['sliding'].append(abs(SlidingSpectrum().extend(values) - layers))
+
+    # the current rate at the end of a drifting run: zero crossings only give the average over the run
+    values, frequency = chirp_series(6000, 120, 80, 0.3, seed)
+    _, track = frequency_track(values)
+    sliding = SlidingSpectrum()
+    sliding.extend(values)
+    average = count_rheed_oscillations(values, None) / len(values)
+
+    values = synthetic_series(100000, 150, 0.2, seed=seed)
+    timings = {}
+    for name, func in (('zero-crossing', count_rheed_oscillations), ('spectral', spectral_layer_count)):
+        start = time.perf_counter()
+        func(values, None)
+        timings[name] = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    SlidingSpectrum().extend(values)
+    sliding_us = (time.perf_counter() - start) / len(values) * 1e6
+
+    return {
+        'trials': trials,
+        'mean_error': {name: float(np.mean(e)) for name, e in errors.items()},
+        'max_error': {name: float(np.max(e)) for name, e in errors.items()},
+        'rate_error': {
+            'zero-crossing': abs(average - frequency[-1]) / frequency[-1],
+            'spectral': abs(track[-1] - frequency[-1]) / frequency[-1],
+            'sliding': abs(sliding.frequency - frequency[-1]) / frequency[-1]
+        },
+        'batch_ms_at_100k': timings,
+        'sliding_us_per_sample': sliding_us
+    }
+
+
+def check_lod(hours=8.0, rate_hz=20.0, pixels=1500, views=50, seed=0):
+    # an 8-hour run fed in as it would arrive live, then random zooms: every drawn point must be a real
+    # sample of the smoothed series, and the visible peaks and troughs must all be drawn
+    n = int(hours * 3600 * rate_hz)
+    times = np.arange(n) / rate_hz
+    values = synthetic_series(n, rate_hz * 7, 0.1, seed=seed)
+    reference = smooth(values)
+    reference = (reference - reference.min()) / (reference.max() - reference.min()) * 100
+
+    # a live plot catches up with what arrived since its last refresh
+    lod = SmoothedPyramid()
+    chunk = 64
+    start = time.perf_counter()
+    for end in range(chunk, n + chunk, chunk):
+        lod.update(times[:end], values[:end])
+    update_ms = (time.perf_counter() - start) / -(-n // chunk) * 1000
+
+    rng = np.random.default_rng(seed)
+    most_points, slowest, exact, covered = 0, 0.0, True, True
+    for k in range(views):
+        span = times[-1] if k == 0 else times[-1] * 10 ** rng.uniform(-4, 0)
+        x_min = rng.uniform(0, times[-1] - span) if k else 0.0
+        x_max = x_min + span
+        start = time.perf_counter()
+        drawn_times, drawn = lod.view(x_min, x_max, pixels)
+        slowest = max(slowest, time.perf_counter() - start)
+        most_points = max(most_points, len(drawn))
+
+        index = np.rint(drawn_times * rate_hz).astype(int)
+        exact = exact and np.allclose(drawn, reference[index])
+        visible = reference[(times >= x_min) & (times <= x_max)]
+        covered = covered and drawn.max() >= visible.max() - 1e-9 and drawn.min() <= visible.min() + 1e-9
+
+    return {
+        'samples': n,
+        'pixels': pixels,
+        'views': views,
+        'chunk': chunk,
+        'update_ms': update_ms,
+        'most_points': most_points,
+        'slowest_view_ms': slowest * 1000,
+        'exact': bool(exact),
+        'extremes_drawn': bool(covered)
+    }
+
+
+def check_adaptive(idle_s=60.0, growth_s=20.0, cycles=2, fps=30.0, period_s=2.0, size=(640, 480)):
+    # growth interrupted by idle stretches: adaptive sampling should recover the layer count of a full-rate
+    # pass from far fewer metric evaluations
+    plan = [(False, int(idle_s * fps)), (True, int(growth_s * fps))] * cycles + [(False, int(idle_s * fps))]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'interrupted.avi')
+        layers = write_synthetic_video(path, size, fps=fps, period_s=period_s, plan=plan)
+        results = []
+        for sampler in (FrameSampler('stride', 1), FrameSampler('adaptive', 1)):
+            start = time.perf_counter()
+            time_points, values = analyze_video(path, sampler=sampler)
+            elapsed = time.perf_counter() - start
+            results.append({
+                'sampler': repr(sampler),
+                'samples': len(time_points),
+                'seconds': elapsed,
+                'layers': count_layers(values, time_points),
+                'expected': layers
+            })
+    return results
+
+
+def frame_path_memory(path, sampler, buffers, frames):
+    # grab, retrieve and measure each frame as the batch reader does, tracing what each frame allocates
+    cap = cv2.VideoCapture(path)
+    reader = FrameReader(cap, sampler, buffers)
+    values, peaks, sizes = [], [], []
+    collections = sum(s['collections'] for s in gc.get_stats())
+    tracemalloc.start()
+    for i in range(frames):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        if not cap.grab():
+            break
+        frame = reader.retrieve()
+        values.append(frame_metric(frame))
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        sizes.append(current)
+    tracemalloc.stop()
+    collections = sum(s['collections'] for s in gc.get_stats()) - collections
+    cap.release()
+
+    # timed separately, since tracing slows every allocation down
+    cap = cv2.VideoCapture(path)
+    reader = FrameReader(cap, sampler, buffers)
+    start = time.perf_counter()
+    for _ in range(frames):
+        if not cap.grab():
+            break
+        frame_metric(reader.retrieve())
+    elapsed = time.perf_counter() - start
+    cap.release()
+
+    warmup = min(10, len(sizes) - 1)
+    return {
+        'sampler': repr(sampler),
+        'buffers': buffers,
+        'frames': len(values),
+        'values': values,
+        'frame_kb': frame.nbytes / 1024,
+        'peak_kb': float(np.median(peaks[warmup:])) / 1024,
+        'growth_kb': (sizes[-1] - sizes[warmup]) / 1024,
+        'gc_collections': collections,
+        'ms_per_frame': elapsed / len(values) * 1000
+    }
+
+
+def check_memory(size=(1280, 720), frames=200, buffers=2):
+    # bytes allocated per frame on the file path: fresh arrays every frame against reused buffers, and
+    # decoding straight to (reduced) grayscale
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'memory.avi')
+        write_synthetic_video(path, size, frames=frames)
+        runs = [frame_path_memory(path, FrameSampler(), None, frames),
+                frame_path_memory(path, FrameSampler(), buffers, frames),
+                frame_path_memory(path, FrameSampler(gray=True), buffers, frames),
+                frame_path_memory(path, FrameSampler(gray=True, downscale=2), buffers, frames)]
+    fresh, reused = runs[:2]
+    for r in runs:
+        # flat: nothing frame-sized left behind or allocated, apart from what the decoder hands back
+        decoded = r['frame_kb'] if 'gray=True' in r['sampler'] else 0
+        r['flat'] = r['peak_kb'] <= decoded + 16 and abs(r['growth_kb']) <= 64
+    reused['exact'] = reused['values'] == fresh['values']
+    return runs
+
+
+def check_held_frames(hold=10, hold_s=0.05, checks=200, capacity=8, size=(320, 240), limit_s=60.0):
+    # the live capture path with a consumer that holds `hold` frames at a time while capture keeps running:
+    # a held frame must never be written over, and capture drops frames while every buffer is out
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'held.avi')
+        write_synthetic_video(path, size, frames=4000)
+        buffers = BufferPool(capacity + hold + 1)
+        ring = FrameRing(capacity, DROP_OLDEST, release=lambda item: buffers.release(item[1]))
+        capture = CaptureThread(path, ring, FrameSampler('stride', 1), frame_size=None, buffers=buffers)
+        capture.start()
+        capture.opened.wait()
+
+        held, checked, overwritten = [], 0, 0
+        deadline = time.perf_counter() + limit_s
+        while checked < checks and time.perf_counter() < deadline:
+            item = ring.get(timeout=1.0)
+            if item is None:
+                break
+            frame = item[1]
+            held.append((frame, frame.copy()))
+            if len(held) < hold:
+                continue
+            time.sleep(hold_s)
+            for frame, snapshot in held:
+                overwritten += not np.array_equal(frame, snapshot)
+                buffers.release(frame)
+            checked += len(held)
+            held = []
+        capture.stop()
+        capture.join()
+    return {
+        'hold': hold,
+        'hold_ms': hold_s * 1000,
+        'checked': checked,
+        'overwritten': overwritten,
+        'dropped': ring.dropped,
+        'buffers': buffers.count,
+        'ok': checked >= checks and overwritten == 0
+    }
+
+
+def check_regions(shape=(2160, 3840), frames=10, size=200):
+    h, w = shape
+    regions = [
+        Region('specular', 'rect', (w // 2 - size // 2, h // 2 - size // 2, size, size)),
+        Region('streak', 'polygon', [(w // 4, h // 4), (w // 4 + size, h // 4), (w // 4 + size // 2, h // 4 + size)]),
+        Region('background', 'rect', (0, 0, size, size))
+    ]
+    color = [cv2.cvtColor(g, cv2.COLOR_GRAY2BGR) for g in synthetic_frames(shape, frames)]
+
+    max_rel_error = 0.0
+    for frame in color:
+        gray = to_gray(frame)
+        values = frame_metric(frame, regions)
+        for region, value in zip(regions, values):
+            crop = region.crop(gray)
+            mask = region.mask_for(crop)
+            reference = frame_brightness_reference(crop if mask is None else crop[mask.astype(bool)])
+            max_rel_error = max(max_rel_error, abs(value - reference) / abs(reference))
+
+    full_time = time_per_frame(frame_metric, color)
+    region_time = time_per_frame(lambda frame: frame_metric(frame, regions), color)
+    return {
+        'shape': shape,
+        'regions': len(regions),
+        'max_rel_error': max_rel_error,
+        'matches': max_rel_error <= 1e-9,
+        'full_ms': full_time * 1000,
+        'region_ms': region_time * 1000,
+        'speedup': full_time / region_time if region_time > 0 else float('inf')
+    }
+
+
+def check_export_roundtrip(samples=1000000, seed=0):
+    times = np.arange(samples) / 30.0
+    values = synthetic_series(samples, 150, 0.2, seed=seed)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in ('json', 'csv'):
+            path = os.path.join(directory, f"series.{fmt}")
+            start = time.perf_counter()
+            export_series(path, times, values, 0, 3.5)
+            export_s = time.perf_counter() - start
+            start = time.perf_counter()
+            data = import_series(path)
+            import_s = time.perf_counter() - start
+            results.append({
+                'format': fmt,
+                'samples': samples,
+                'megabytes': os.path.getsize(path) / 1e6,
+                'export_s': export_s,
+                'import_s': import_s,
+                'matches': (np.array_equal(data['time_points'], times) and
+                            np.array_equal(data['brightness_values'], values))
+            })
+    return results
+
+
+def check_publisher(samples=2000, rate_hz=500, clients=3, client_buffer=256, send_buffer=4096):
+    # fast subscribers must see every sample in order; a subscriber that never reads must lose samples
+    # rather than hold up publish(). Small kernel buffers on both ends of the stalled connection make sure
+    # its backlog reaches the publisher's bounded queue instead of being absorbed by the kernel
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for framing in FRAMINGS:
+            for address in ('tcp:127.0.0.1:0', f"unix:{os.path.join(directory, framing + '.sock')}"):
+                if address.startswith('unix') and not hasattr(socket, 'AF_UNIX'):
+                    continue
+                publisher = SamplePublisher(address, framing, client_buffer, send_buffer)
+                bound = publisher.start()
+                sent = np.zeros(samples)
+                received = [np.full(samples, np.nan) for _ in range(clients)]
+                orders = [[] for _ in range(clients)]
+
+                def read(i):
+                    for sample in subscribe(bound, timeout=10):
+                        index = int(sample['time'])
+                        received[i][index] = time.perf_counter()
+                        orders[i].append(index)
+                        if index == samples - 1:
+                            return
+
+                readers = [threading.Thread(target=read, args=(i,), daemon=True) for i in range(clients)]
+                for reader in readers:
+                    reader.start()
+                family, target = parse_address(bound)
+                stalled = socket.socket(family, socket.SOCK_STREAM)
+                stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+                stalled.connect(target)
+                deadline = time.perf_counter() + 5
+                while publisher.client_count < clients + 1 and time.perf_counter() < deadline:
+                    time.sleep(0.001)
+
+                publish_times = np.zeros(samples)
+                start = time.perf_counter()
+                for i in range(samples):
+                    # pace to the target rate, as a live camera would
+                    while time.perf_counter() < start + i / rate_hz:
+                        time.sleep(0.0002)
+                    sent[i] = time.perf_counter()
+                    publisher.publish('bench', 0, float(i), [1.0, 2.0], i / 100, 300.0)
+                    publish_times[i] = time.perf_counter() - sent[i]
+                for reader in readers:
+                    reader.join(10)
+                stalled.close()
+                publisher.stop()
+
+                latency = np.concatenate([r - sent for r in received])
+                results.append({
+                    'framing': framing,
+                    'transport': address.split(':', 1)[0],
+                    'samples': samples,
+                    'complete': all(order == list(range(samples)) for order in orders),
+                    'latency_p50_ms': float(np.nanpercentile(latency, 50) * 1000),
+                    'latency_p99_ms': float(np.nanpercentile(latency, 99) * 1000),
+                    'publish_max_us': float(publish_times.max() * 1e6),
+                    'stalled_dropped': publisher.dropped
+                })
+    return results
+
+
+def startup_environment():
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return env
+
+
+def import_profile(module='gandiva', top=10):
+    # cumulative import time of each module gandiva imports directly, from python -X importtime
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            capture_output=True, text=True, env=startup_environment(),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('   ') and not name.startswith('    '):
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(modules, key=lambda m: -m[1])[:top]
+
+
+def measure_startup(runs=5):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output=True, text=True,
+                                env=startup_environment(), cwd=directory)
+        total = time.perf_counter() - start
+        if result.returncode:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'startup failed')
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        sample['process_s'] = total
+        samples.append(sample)
+
+    return {
+        'runs': runs,
+        'import_s': float(np.median([s['import_s'] for s in samples])),
+        'window_s': float(np.median([s['window_s'] for s in samples])),
+        'process_s': float(np.median([s['process_s'] for s in samples])),
+        'ready_s': float(np.median([s['import_s'] + s['window_s'] for s in samples])),
+        'deferred_loaded': samples[-1]['deferred'],
+        'imports': import_profile()
+    }
+
+
+def write_synthetic_video(path, size=(640, 480), frames=300, fps=30.0, period_s=2.0, noise=0.15, seed=0, plan=None):
+    # a bright specular spot whose intensity oscillates once per period_s on a noisy background,
+    # so the expected layer count is known exactly: one per complete period. `plan` lists (growing, frames)
+    # stretches; while not growing the pattern holds still, as with the shutter closed
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (w, h))
+    if not writer.isOpened():
+        raise IOError(f"could not create {path}")
+
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[:h, :w]
+    spot = np.exp(-((xx - w / 2) ** 2 + (yy - h / 2) ** 2) / (0.0005 * h * w)).astype(np.float32)
+    backgrounds = [(40 + 60 * noise * rng.standard_normal((h, w))).astype(np.float32) for _ in range(8)]
+    i = grown = 0
+    for growing, count in plan or [(True, frames)]:
+        for _ in range(count):
+            amplitude = 0.6 + 0.4 * np.cos(2 * np.pi * grown / (period_s * fps))
+            img = backgrounds[i % len(backgrounds)] + 180 * amplitude * spot
+            writer.write(cv2.cvtColor(np.clip(img, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR))
+            i += 1
+            grown += growing
+    writer.release()
+    return int(grown / (period_s * fps))
+
+
+def stage_timing(total_s, items):
+    return {
+        'items': items,
+        'total_s': total_s,
+        'per_item_ms': total_s / items * 1000 if items else None,
+        'per_second': items / total_s if total_s > 0 else None
+    }
+
+
+def time_plot(time_points, brightness_values, repeats=3):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication
+    import gandiva
+
+    app = QApplication.instance() or QApplication([])
+    canvas = gandiva.PlotCanvas()
+    analyzer = SimpleNamespace(series=TimeSeries.from_arrays(time_points, brightness_values),
+                               time_points=time_points, brightness_values=brightness_values, region_names=[])
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        canvas.plot_data(analyzer)
+        best = min(best, time.perf_counter() - start)
+    app.processEvents()
+    return best
+
+
+def measure_stages(video_path, expected_layers, plot=True):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"could not open {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+
+    totals = dict.fromkeys(('decode', 'grayscale', 'metric'), 0.0)
+    values = []
+    while True:
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        decoded = time.perf_counter()
+        if not ret:
+            break
+        gray = to_gray(frame)
+        converted = time.perf_counter()
+        values.append(frame_brightness(gray))
+        measured = time.perf_counter()
+
+        totals['decode'] += decoded - start
+        totals['grayscale'] += converted - decoded
+        totals['metric'] += measured - converted
+    cap.release()
+
+    frames = len(values)
+    brightness_values = np.array(values)
+    time_points = np.arange(frames) / fps
+    stages = {name: stage_timing(total, frames) for name, total in totals.items()}
+
+    # one untimed call first: scipy is imported on first use, and that import is not part of the count stage
+    count_rheed_oscillations(brightness_values, time_points)
+    repeats = 20
+    start = time.perf_counter()
+    for _ in range(repeats):
+        counted = count_rheed_oscillations(brightness_values, time_points)
+    stages['count'] = stage_timing(time.perf_counter() - start, repeats)
+
+    if plot:
+        try:
+            stages['plot'] = stage_timing(time_plot(time_points, brightness_values), 1)
+        except ImportError as e:
+            print(f"Skipping plot stage: {e}")
+
+    return {
+        'frames': frames,
+        'expected_layers': expected_layers,
+        'counted_layers': counted,
+        'layers_ok': counted == expected_layers,
+        'stages': stages
+    }
+
+
+def run_suite(resolutions=SUITE_RESOLUTIONS, frames=300, fps=30.0, period_s=2.0, noise=0.15, plot=True,
+              video_dir=None):
+    report = {
+        'report_version': REPORT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'cpu_count': os.cpu_count(),
+        'runs': []
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        directory = video_dir or directory
+        for w, h in resolutions:
+            path = os.path.join(directory, f"synthetic-{w}x{h}.avi")
+            expected = write_synthetic_video(path, (w, h), frames, fps, period_s, noise)
+            run = measure_stages(path, expected, plot)
+            run.update({'resolution': [w, h], 'fps': fps, 'period_s': period_s, 'noise': noise})
+            report['runs'].append(run)
+    return report
+
+
+def print_suite_report(report):
+    print(f"{'resolution':>10}  " + '  '.join(f"{name:>14}" for name in SUITE_STAGES) + "  layers")
+    for run in report['runs']:
+        cells = []
+        for name in SUITE_STAGES:
+            stage = run['stages'].get(name)
+            cells.append(f"{stage['per_item_ms']:11.3f} ms" if stage else f"{'-':>14}")
+        w, h = run['resolution']
+        print(f"{f'{w}x{h}':>10}  " + '  '.join(cells) +
+              f"  {run['counted_layers']}/{run['expected_layers']} {'OK' if run['layers_ok'] else 'MISMATCH'}")
+
+
+def compare_reports(report, baseline, tolerance=0.2):
+    # a stage regresses when it takes more than (1 + tolerance) times as long per item as in the baseline
+    previous = {tuple(run['resolution']): run for run in baseline['runs']}
+    regressions = []
+    for run in report['runs']:
+        old = previous.get(tuple(run['resolution']))
+        if old is None:
+            continue
+        for name, stage in run['stages'].items():
+            old_stage = old['stages'].get(name)
+            if not old_stage or not old_stage['per_item_ms'] or not stage['per_item_ms']:
+                continue
+            ratio = stage['per_item_ms'] / old_stage['per_item_ms']
+            if ratio > 1 + tolerance:
+                regressions.append((tuple(run['resolution']), name, old_stage['per_item_ms'],
+                                    stage['per_item_ms'], ratio))
+    return regressions
+
+
+def parse_resolution(text):
+    try:
+        w, h = (int(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"resolution {text!r} should look like 1920x1080")
+    return w, h
+
+
+def main(argv=None, prog='benchmark.py'):
+    parser = argparse.ArgumentParser(prog=prog, description='Gandiva performance checks.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    kernel = sub.add_parser('kernel', help='compare the histogram frame metric against the reference implementation')
+    kernel.add_argument('videos', nargs='*', help='optional videos to sample real frames from')
+    kernel.add_argument('--frames', type=int, default=20)
+
+    sub.add_parser('counter', help='check the streaming oscillation counter against count_rheed_oscillations')
+
+    sub.add_parser('spectral', help='compare the spectral layer estimate against zero-crossing counting')
+
+    startup = sub.add_parser('startup', help='time a cold start of the GUI and list the slowest imports')
+    startup.add_argument('--runs', type=int, default=5)
+    startup.add_argument('--target', type=float, default=STARTUP_TARGET_S,
+                         help='import plus first paint of the main window, in seconds')
+
+    publish = sub.add_parser('publisher', help='stream samples to local subscribers and time their latency')
+    publish.add_argument('--samples', type=int, default=2000)
+    publish.add_argument('--rate', type=float, default=500, help='samples per second')
+    publish.add_argument('--clients', type=int, default=3)
+    publish.add_argument('--max-publish-ms', type=float, default=PUBLISH_MAX_MS,
+                         help='slowest publish() call allowed')
+
+    lod = sub.add_parser('lod', help='check the plot decimation pyramid on a multi-hour series')
+    lod.add_argument('--hours', type=float, default=8.0)
+    lod.add_argument('--rate', type=float, default=20.0, help='samples per second')
+    lod.add_argument('--pixels', type=int, default=1500, help='axes width in pixels')
+
+    adaptive = sub.add_parser('adaptive', help='compare adaptive sampling with a full-rate pass on an interrupted run')
+    adaptive.add_argument('--idle', type=float, default=60.0, help='seconds of each idle stretch')
+    adaptive.add_argument('--growth', type=float, default=20.0, help='seconds of each growth stretch')
+
+    memory = sub.add_parser('memory', help='trace what each frame allocates with fresh and with reused buffers')
+    memory.add_argument('--frames', type=int, default=200)
+    memory.add_argument('--resolution', type=parse_resolution, default=(1280, 720), metavar='WxH')
+
+    held = sub.add_parser('held', help='hold live frames while capture keeps running and check none is overwritten')
+    held.add_argument('--hold', type=int, default=10, help='frames held at once')
+    held.add_argument('--hold-ms', type=float, default=50.0)
+
+    sub.add_parser('roi', help='time per-region metrics against the whole-frame metric on 4K frames')
+
+    export = sub.add_parser('export', help='time a JSON and CSV export/import round trip')
+    export.add_argument('--samples', type=int, default=1000000)
+
+    suite = sub.add_parser('suite', help='time each pipeline stage on generated RHEED videos with a known layer count')
+    suite.add_argument('--resolutions', nargs='+', type=parse_resolution, default=SUITE_RESOLUTIONS,
+                       metavar='WxH')
+    suite.add_argument('--frames', type=int, default=300)
+    suite.add_argument('--fps', type=float, default=30.0)
+    suite.add_argument('--period', type=float, default=2.0, help='oscillation period in seconds')
+    suite.add_argument('--noise', type=float, default=0.15, help='background noise relative to the spot amplitude')
+    suite.add_argument('--no-plot', action='store_true', help='skip the PlotCanvas stage')
+    suite.add_argument('--keep-videos', default=None, metavar='DIR', help='write the generated videos here')
+    suite.add_argument('--json', default=None, metavar='PATH', help='write a machine-readable report')
+    suite.add_argument('--baseline', default=None, metavar='PATH', help='compare against an earlier --json report')
+    suite.add_argument('--tolerance', type=float, default=0.2,
+                       help='allowed slowdown per stage before it counts as a regression (0.2 = 20%%)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'kernel':
+        results = run_kernel_check(args.videos, args.frames)
+        return 0 if all(r['matches'] for r in results) else 1
+
+    if args.command == 'counter':
+        r = check_streaming_counter()
+        print(f"{r['checks']} prefixes checked: {r['exact_mismatches']} exact mismatches, "
+              f"{r['live_differences']} provisional counts awaiting a resync")
+        print(f"streaming update: {r['streaming_us_per_sample']:.1f} us/sample, "
+              f"batch recount at 100k samples: {r['batch_us_per_sample_at_100k']:.0f} us/sample")
+        return 0 if r['exact_mismatches'] == 0 else 1
+
+    if args.command == 'spectral':
+        r = check_spectral()
+        print(f"{r['trials']} synthetic runs, layer count error (mean / max):")
+        for name in r['mean_error']:
+            print(f"  {name:>13}  {r['mean_error'][name]:.3f} / {r['max_error'][name]:.3f} layers   "
+                  f"current rate error on a drifting run {r['rate_error'][name] * 100:5.1f}%")
+        print(f"batch at 100k samples: zero-crossing {r['batch_ms_at_100k']['zero-crossing']:.1f} ms, "
+              f"spectral {r['batch_ms_at_100k']['spectral']:.1f} ms; "
+              f"sliding update {r['sliding_us_per_sample']:.1f} us/sample")
+        return 0 if r['mean_error']['spectral'] <= r['mean_error']['zero-crossing'] else 1
+
+    if args.command == 'startup':
+        r = measure_startup(args.runs)
+        print(f"median of {r['runs']} cold starts: import {r['import_s']:.2f} s, window {r['window_s']:.2f} s, "
+              f"ready {r['ready_s']:.2f} s (target {args.target:.2f} s), whole process {r['process_s']:.2f} s")
+        if r['deferred_loaded']:
+            print(f"loaded at startup although deferred: {', '.join(r['deferred_loaded'])}")
+        print("slowest imports:")
+        for name, seconds in r['imports']:
+            print(f"  {name:<40} {seconds * 1000:7.1f} ms")
+        return 0 if r['ready_s'] <= args.target and not r['deferred_loaded'] else 1
+
+    if args.command == 'publisher':
+        results = check_publisher(args.samples, args.rate, args.clients)
+        for r in results:
+            r['ok'] = (r['complete'] and r['stalled_dropped'] > 0 and
+                       r['publish_max_us'] <= args.max_publish_ms * 1000)
+            verdict = 'OK' if r['ok'] else 'INCOMPLETE' if not r['complete'] else (
+                'NO DROPS' if not r['stalled_dropped'] else 'SLOW PUBLISH')
+            print(f"{r['framing']:>6} over {r['transport']:<4}  {r['samples']} samples  latency p50 "
+                  f"{r['latency_p50_ms']:.3f} ms, p99 {r['latency_p99_ms']:.3f} ms  publish max "
+                  f"{r['publish_max_us']:.0f} us  stalled client dropped {r['stalled_dropped']}  {verdict}")
+        return 0 if all(r['ok'] for r in results) else 1
+
+    if args.command == 'lod':
+        r = check_lod(args.hours, args.rate, args.pixels)
+        print(f"{r['samples']} samples: update {r['update_ms']:.2f} ms per {r['chunk']} new samples; {r['views']} views "
+              f"{r['pixels']} px wide drew at most {r['most_points']} points, slowest {r['slowest_view_ms']:.2f} ms  "
+              f"{'OK' if r['exact'] and r['extremes_drawn'] else 'MISMATCH'}")
+        return 0 if r['exact'] and r['extremes_drawn'] else 1
+
+    if args.command == 'adaptive':
+        results = check_adaptive(args.idle, args.growth)
+        for r in results:
+            print(f"{r['sampler']:<70} {r['samples']:6d} samples  {r['seconds']:6.2f} s  "
+                  f"layers {r['layers']} (expected {r['expected']})")
+        full, adaptive = results
+        return 0 if adaptive['layers'] == adaptive['expected'] and adaptive['samples'] < full['samples'] else 1
+
+    if args.command == 'memory':
+        runs = check_memory(args.resolution, args.frames)
+        for r in runs:
+            print(f"{r['sampler']:<58} buffers {str(r['buffers']):>4}  {r['ms_per_frame']:5.2f} ms/frame  "
+                  f"peak {r['peak_kb']:7.1f} kB/frame (frame {r['frame_kb']:6.1f} kB)  "
+                  f"growth {r['growth_kb']:6.1f} kB  gc {r['gc_collections']}")
+        fresh, reused = runs[:2]
+        ok = reused['exact'] and all(r['flat'] for r in runs[1:])
+        print(f"reused buffers {'match' if reused['exact'] else 'DIFFER FROM'} fresh arrays; "
+              f"{'OK' if ok else 'NOT FLAT'}")
+        return 0 if ok else 1
+
+    if args.command == 'held':
+        r = check_held_frames(args.hold, args.hold_ms / 1000)
+        print(f"{r['checked']} frames held {r['hold']} at a time for {r['hold_ms']:.0f} ms with {r['buffers']} "
+              f"buffers: {r['overwritten']} overwritten, {r['dropped']} dropped by capture  "
+              f"{'OK' if r['ok'] else 'FAILED'}")
+        return 0 if r['ok'] else 1
+
+    if args.command == 'roi':
+        r = check_regions()
+        print(f"{r['shape'][1]}x{r['shape'][0]} color frames: whole frame {r['full_ms']:.2f} ms, "
+              f"{r['regions']} regions {r['region_ms']:.2f} ms ({r['speedup']:.1f}x), "
+              f"max rel err {r['max_rel_error']:.2e}  {'OK' if r['matches'] else 'MISMATCH'}")
+        return 0 if r['matches'] else 1
+
+    if args.command == 'export':
+        results = check_export_roundtrip(args.samples)
+        for r in results:
+            print(f"{r['format']:>4}  {r['samples']} samples  {r['megabytes']:6.1f} MB  "
+                  f"export {r['export_s']:5.2f} s  import {r['import_s']:5.2f} s  "
+                  f"{'OK' if r['matches'] else 'MISMATCH'}")
+        return 0 if all(r['matches'] for r in results) else 1
+
+    if args.command == 'suite':
+        if args.keep_videos:
+            os.makedirs(args.keep_videos, exist_ok=True)
+        report = run_suite(args.resolutions, args.frames, args.fps, args.period, args.noise,
+                           not args.no_plot, args.keep_videos)
+        print_suite_report(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+        failed = not all(run['layers_ok'] for run in report['runs'])
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_reports(report, json.load(f), args.tolerance)
+            for (w, h), name, old, new, ratio in regressions:
+                print(f"Regression: {name} at {w}x{h} went from {old:.3f} ms to {new:.3f} ms ({ratio:.2f}x)")
+            failed = failed or bool(regressions)
+        return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+
+from runlog import RunLog, open_run_log, LOG_EXTENSION
+
+
+CACHE_VERSION = 1
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.gandiva', 'cache')
+
+
+def fingerprint(path):
+    # size, mtime and a handful of evenly spaced blocks: cheap even for tens of GB, and any re-encode or
+    # truncation changes at least the size or one of the sampled blocks
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, 'rb') as f:
+        last = max(0, stat.st_size - FINGERPRINT_BLOCK_SIZE)
+        for i in range(FINGERPRINT_BLOCKS):
+            f.seek(last * i // (FINGERPRINT_BLOCKS - 1))
+            digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def analysis_key(video_path, parameters):
+    encoded = json.dumps({'version': CACHE_VERSION, 'video': fingerprint(video_path),
+                          'parameters': parameters}, sort_keys=True)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def key_for(self, video_path, parameters):
+        return analysis_key(video_path, parameters)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + LOG_EXTENSION)
+
+    def get(self, key):
+        path = self.path_for(key)
+        try:
+            header, times, values = open_run_log(path)
+        except (OSError, ValueError):
+            return None
+        if not header['closed']:
+            return None
+
+        # the file's mtime doubles as its last-used time for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return times, values
+
+    def put(self, key, times, values, source=''):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(key)
+        partial = f"{path}.{os.getpid()}.tmp"
+        log = RunLog(partial, 0.0, source, columns=values.shape[1] if values.ndim == 2 else None)
+        log.extend(times, values)
+        log.close()
+        os.replace(partial, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(LOG_EXTENSION):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(LOG_EXTENSION):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+
+import cv2
+
+from analysis import FrameSampler, FrameReader
+from instrumentation import Instrumentation
+
+
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST)
+DEFAULT_RING_CAPACITY = 8
+DEFAULT_CAPTURE_SIZE = (640, 480)
+# consecutive failed grabs, GRAB_RETRY_S apart, before a camera counts as gone
+MAX_FAILED_GRABS = 200
+GRAB_RETRY_S = 0.01
+
+
+class FrameRing:
+    def __init__(self, capacity=DEFAULT_RING_CAPACITY, policy=DROP_OLDEST, release=None):
+        if capacity < 1:
+            raise ValueError("ring capacity must be at least 1")
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"unknown drop policy {policy!r}, expected one of {DROP_POLICIES}")
+        self.capacity = capacity
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        # called with every item the ring lets go of without handing it out, so its buffer can be reused
+        self.release = release
+        self._slots = [None] * capacity
+        self._head = 0
+        self._count = 0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return self._count
+
+    def put(self, item):
+        with self._cond:
+            if self._count == self.capacity:
+                self.dropped += 1
+                if self.policy == DROP_NEWEST:
+                    self._release(item)
+                    return False
+                self._release(self._slots[self._head])
+                self._slots[self._head] = None
+                self._head = (self._head + 1) % self.capacity
+                self._count -= 1
+
+            self._slots[(self._head + self._count) % self.capacity] = item
+            self._count += 1
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._count or self.closed, timeout) or not self._count:
+                return None
+
+            item = self._slots[self._head]
+            self._slots[self._head] = None
+            self._head = (self._head + 1) % self.capacity
+            self._count -= 1
+            return item
+
+    def skip(self):
+        # a frame lost before it reached the ring, such as when no buffer was free to retrieve it into
+        with self._cond:
+            self.dropped += 1
+
+    def clear(self):
+        with self._cond:
+            for i in range(self._count):
+                self._release(self._slots[(self._head + i) % self.capacity])
+            self._slots = [None] * self.capacity
+            self._head = 0
+            self._count = 0
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _release(self, item):
+        if self.release:
+            self.release(item)
+
+
+class CaptureThread(threading.Thread):
+    def __init__(self, source, ring, sampler=None, frame_size=DEFAULT_CAPTURE_SIZE, perf=None, fourcc=None,
+                 buffers=None):
+        super().__init__(daemon=True)
+        self.source = source
+        self.ring = ring
+        self.sampler = sampler or FrameSampler()
+        self.frame_size = frame_size
+        # e.g. 'MJPG', which most USB cameras can send at full frame rate where raw YUYV cannot
+        self.fourcc = fourcc
+        # frames are retrieved into buffers from this pool, and the consumer releases each one when it is
+        # done with the frame; while all are out, frames are dropped rather than written over
+        self.buffers = buffers
+        self.perf = perf or Instrumentation()
+        self.running = True
+        self.paused = False
+        self.failed = False
+        self.opened = threading.Event()
+        self.fps = None
+        self.start_time = None
+        self.frames_grabbed = 0
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            self.failed = True
+            self.opened.set()
+            self.ring.close()
+            return
+
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.frame_size:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_size[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_size[1])
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30
+
+        reader = FrameReader(cap, self.sampler, self.buffers)
+        schedule = self.sampler.schedule()
+        # a file has simply ended when a grab fails; a camera may only have hiccupped
+        is_file = isinstance(self.source, str) and os.path.isfile(self.source)
+        failed_grabs = 0
+        self.start_time = time.perf_counter()
+        self.opened.set()
+
+        while self.running:
+            # keep draining the driver even while paused so frames never queue up stale in the camera buffer
+            with self.perf.stage('grab'):
+                grabbed = cap.grab()
+            if not grabbed:
+                failed_grabs += 1
+                if is_file or failed_grabs >= MAX_FAILED_GRABS:
+                    # closing the ring below lets the consumer drain what is left and finish
+                    break
+                time.sleep(GRAB_RETRY_S)
+                continue
+            failed_grabs = 0
+            timestamp = time.perf_counter() - self.start_time
+            self.frames_grabbed += 1
+
+            if self.paused or not schedule.wants(self.frames_grabbed, self.fps):
+                continue
+
+            if self.buffers is not None and not self.buffers.available:
+                self.ring.skip()
+                continue
+
+            with self.perf.stage('retrieve'):
+                frame = reader.retrieve()
+            if frame is not None:
+                schedule.observe(self.frames_grabbed, frame)
+                self.ring.put((timestamp, frame))
+
+        cap.release()
+        self.ring.close()
+
+    def stop(self):
+        self.running = False
+
+    def pause(self):
+        self.paused = True
+        self.ring.clear()
+
+    def resume(self):
+        self.paused = False
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+from runlog import RunLog, open_run_log
+
+
+CHECKPOINT_EXTENSION = '.ckpt'
+DEFAULT_CHECKPOINT_INTERVAL = 2.0
+
+
+def default_checkpoint_dir():
+    return os.path.join(os.path.expanduser('~'), '.gandiva', 'checkpoints')
+
+
+class Checkpoint:
+    # the partial series of one video analysis, appended as it is measured; the last whole record marks
+    # the frame position to resume from
+    def __init__(self, key, directory=None, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.directory = directory or default_checkpoint_dir()
+        self.path = os.path.join(self.directory, key + CHECKPOINT_EXTENSION)
+        self.interval = interval
+        self.log = None
+
+    def load(self):
+        try:
+            _, times, values = open_run_log(self.path)
+        except (OSError, ValueError):
+            return None
+        if not len(times):
+            return None
+        return np.array(times), np.array(values)
+
+    def start(self, source, columns=None, resume=False):
+        os.makedirs(self.directory, exist_ok=True)
+        if resume and os.path.exists(self.path):
+            self.log = RunLog.reopen(self.path, self.interval)
+        else:
+            self.log = RunLog(self.path, 0.0, source, self.interval, columns)
+
+    def append(self, time_point, brightness):
+        self.log.append(time_point, brightness)
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,98 @@
+import glob
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+DEVICE_CACHE_VERSION = 1
+FALLBACK_INDICES = range(5)
+PROBE_WORKERS = 4
+VIDEO_NODE_PATTERN = '/dev/video*'
+
+
+def default_device_cache():
+    return os.path.join(os.path.expanduser('~'), '.gandiva', 'devices.json')
+
+
+def video_nodes():
+    # V4L2 nodes on Linux; None elsewhere, where indices can only be found by trying to open them
+    if not sys.platform.startswith('linux'):
+        return None
+    nodes = []
+    for path in glob.glob(VIDEO_NODE_PATTERN):
+        match = re.fullmatch(r'/dev/video(\d+)', path)
+        if match:
+            nodes.append((int(match.group(1)), path))
+    return sorted(nodes)
+
+
+def candidate_indices():
+    nodes = video_nodes()
+    return list(FALLBACK_INDICES) if nodes is None else [index for index, _ in nodes]
+
+
+def probe_device(index):
+    cap = cv2.VideoCapture(index)
+    try:
+        if not cap.isOpened():
+            return None
+        # many V4L2 nodes are metadata or output nodes that open but never deliver a frame
+        if not cap.grab():
+            return None
+        return {
+            'index': index,
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': cap.get(cv2.CAP_PROP_FPS) or None
+        }
+    finally:
+        cap.release()
+
+
+def discover_devices(indices=None, known=None, workers=PROBE_WORKERS):
+    # probes the candidates in parallel, since a failing open can block for seconds; devices in `known`
+    # (index -> info) are taken as they are, for cameras that are busy in a live session
+    indices = candidate_indices() if indices is None else list(indices)
+    known = known or {}
+    probe = [index for index in indices if index not in known]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(probe) or 1))) as pool:
+        found = [info for info in pool.map(probe_device, probe) if info]
+    found.extend(known[index] for index in indices if index in known)
+    return sorted(found, key=lambda info: info['index'])
+
+
+def describe_device(info):
+    text = f"Camera {info['index']}"
+    if info.get('width') and info.get('height'):
+        text += f" ({info['width']}x{info['height']}"
+        text += f" @ {info['fps']:g} fps)" if info.get('fps') else ")"
+    return text
+
+
+def load_device_cache(path=None):
+    try:
+        with open(path or default_device_cache()) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    # anything but the expected object, such as a hand-edited or truncated file, counts as no cache
+    if not isinstance(data, dict) or data.get('version') != DEVICE_CACHE_VERSION:
+        return []
+    devices = data.get('devices', [])
+    if not isinstance(devices, list) or not all(isinstance(info, dict) and 'index' in info for info in devices):
+        return []
+    return devices
+
+
+def save_device_cache(devices, path=None):
+    path = path or default_device_cache()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, 'w') as f:
+        json.dump({'version': DEVICE_CACHE_VERSION, 'updated': time.time(), 'devices': devices}, f, indent=2)
+    os.replace(partial, path)
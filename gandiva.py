@@ -1,49 +1,77 @@
-import cv2
 import numpy as np
 import sys
-from tqdm import tqdm
-from scipy.signal import find_peaks, savgol_filter
-from scipy import ndimage, signal
+import argparse
+import copy
+import importlib
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# the command line tools are dispatched before the Qt and matplotlib imports below so they never load the GUI;
+# their module stands in as __main__, since that is what spawned worker processes import again
+COMMANDS = {'analyze': 'analysis', 'bench': 'benchmark', 'listen': 'publisher'}
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+    tool = importlib.import_module(COMMANDS[sys.argv[1]])
+    sys.modules['__main__'] = tool
+    sys.exit(tool.main(sys.argv[2:], prog=f"gandiva.py {sys.argv[1]}"))
+
 from PySide6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
-                               QWidget, QPushButton, QFileDialog, QLabel, QDoubleSpinBox, QComboBox, QSplashScreen)
-from PySide6.QtCore import QThread, Signal, Qt, QTimer, QUrl, QPropertyAnimation, QEasingCurve
-from PySide6.QtGui import QPalette, QColor, QPixmap, QIcon
-from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
-import matplotlib.pyplot as plt
+                               QWidget, QPushButton, QFileDialog, QLabel, QDoubleSpinBox, QComboBox, QSplashScreen,
+                               QMessageBox, QInputDialog, QCheckBox, QTabWidget, QTabBar)
+from PySide6.QtCore import QObject, QThread, Signal, Qt, QFileSystemWatcher, QTimer, QUrl, QPropertyAnimation, QEasingCurve
+from PySide6.QtGui import QPalette, QColor, QPixmap, QIcon, QKeySequence, QShortcut
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
-import json
+from analysis import (count_layers, even_series, format_layers, frame_metric, to_gray, analyze_video,
+                      checkpointed_analyze_video, analysis_parameters, export_series, import_series, growth_summary,
+                      BufferPool, BufferRing, FrameSampler, ResampledCounter, StreamingOscillationCounter)
+from cache import AnalysisCache, analysis_key
+from checkpoint import Checkpoint, default_checkpoint_dir
+from instrumentation import Instrumentation
+from lod import SmoothedPyramid
+from roi import parse_regions
+from series import TimeSeries
+from spectral import SlidingSpectrum, frequency_track, growth_rate_from_frequency
+from runlog import (RunLog, LOG_EXTENSION, default_run_dir, open_run_log, find_unclosed_logs, mark_closed,
+                    prune_closed_logs)
+from capture import FrameRing, CaptureThread, DEFAULT_RING_CAPACITY, DROP_OLDEST
+from publisher import SamplePublisher, DEFAULT_ADDRESS, FRAMINGS, JSON_FRAMING
+from devices import (default_device_cache, describe_device, discover_devices, load_device_cache, save_device_cache,
+                     video_nodes)
 
 
-def count_rheed_oscillations(brightness_values, time_points):
-    if len(brightness_values) < 20:
-        return 0
-    
-    detrended = signal.detrend(brightness_values, type='linear')
-    
-    window_length = min(21, len(detrended)//4)
-    if window_length % 2 == 0:
-        window_length += 1
-    if window_length < 5:
-        window_length = 5
-    
-    smoothed = savgol_filter(detrended, window_length=window_length, polyorder=3)
-    
-    sign_changes = np.diff(np.sign(smoothed))
-    zero_crossings = np.where(sign_changes != 0)[0]
-    
-    min_separation = 10
-    filtered_crossings = []
-    last_crossing = -min_separation
-    
-    for crossing in zero_crossings:
-        if crossing - last_crossing >= min_separation:
-            filtered_crossings.append(crossing)
-            last_crossing = crossing
-    
-    return len(filtered_crossings) // 2
+SAMPLING_PRESETS = {
+    'Every frame': ('stride', 1),
+    'Every 2nd frame': ('stride', 2),
+    'Every 4th frame': ('stride', 4),
+    'Every 8th frame': ('stride', 8),
+    '10 samples/s': ('rate', 1, 10),
+    'Quick look (1/s)': ('seek', 1, 1),
+    'Adaptive (1st-32nd)': ('adaptive', 1),
+}
+DEFAULT_SAMPLING_PRESET = 'Every 4th frame'
+ESTIMATOR_PRESETS = {
+    'Zero crossings': 'zero-crossing',
+    'Spectral': 'spectral',
+}
+LIVE_REFRESH_HZ = 20
+LIVE_WINDOW_S = 60
+PERF_REFRESH_MS = 500
+HOTPLUG_SETTLE_MS = 1000
+REGION_COLORS = ['#1f3a93', '#e67e22', '#27ae60', '#8e44ad', '#c0392b', '#16a085']
+# imported after the window is shown instead of at startup, before the first plot or analysis needs them
+DEFERRED_MODULES = ('scipy.signal',)
+
+
+def preload_modules():
+    for name in DEFERRED_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Error preloading {name}: {e}")
 
 
 class SplashScreen(QSplashScreen):
@@ -83,6 +111,8 @@ class SplashScreen(QSplashScreen):
         self.activateWindow()
         
         try:
+            # QtMultimedia is only needed for the jingle, and is slow to load or missing on some installs
+            from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
             self.media_player = QMediaPlayer()
             self.audio_output = QAudioOutput()
             self.media_player.setAudioOutput(self.audio_output)
@@ -90,14 +120,11 @@ class SplashScreen(QSplashScreen):
         except:
             self.media_player = None
         
+        # the splash fades out once the main window is up rather than after a fixed delay
         self.timer = QTimer()
         self.timer.timeout.connect(self.play_sound)
         self.timer.setSingleShot(True)
-        self.timer.start(500)
-        
-        self.close_timer = QTimer()
-        self.close_timer.timeout.connect(self.start_fadeout)
-        self.close_timer.setSingleShot(True)
+        self.timer.start(0)
 
     def play_sound(self):
         if self.media_player:
@@ -108,7 +135,6 @@ class SplashScreen(QSplashScreen):
                     self.media_player.play()
             except:
                 pass
-        self.close_timer.start(4500)
     
     def start_fadeout(self):
         self.fade_animation = QPropertyAnimation(self, b"windowOpacity")
@@ -120,8 +146,10 @@ class SplashScreen(QSplashScreen):
         self.fade_animation.start()
 
 class LiveAnalysisThread(QThread):
-    new_data_point = Signal(float, float)
+    new_data_point = Signal(float, object)
+    frames_dropped = Signal(int)
     progress = Signal(int)
+    capture_failed = Signal()
     finished = Signal()
     
     def __init__(self, rheed_analyzer, device_index):
@@ -132,120 +160,333 @@ class LiveAnalysisThread(QThread):
         self.paused = False
         self.frame_count = 0
         self.start_time = None
+        # frames are captured into a pool the size of the ring plus the frames being measured; each buffer
+        # goes back once its frame is converted, measured or dropped, and capture drops frames while none is free
+        self.queue_depth = max(1, self.analyzer.live_queue_depth)
+        self.buffers = BufferPool(self.analyzer.live_ring_capacity + self.queue_depth + 1)
+        self.ring = FrameRing(self.analyzer.live_ring_capacity, self.analyzer.live_drop_policy,
+                              release=lambda item: self.buffers.release(item[1]))
+        self.perf = self.analyzer.perf
+        self.regions = list(self.analyzer.regions)
+        self.pool = self.analyzer.metric_pool
+        sampler = copy.copy(self.analyzer.sampler)
+        sampler.gray = self.analyzer.live_gray
+        self.capture = CaptureThread(self.device_index, self.ring, sampler, perf=self.perf,
+                                     fourcc=self.analyzer.live_fourcc, buffers=self.buffers)
+        self.grays = BufferRing(self.queue_depth + 1)
         
     def run(self):
-        cap = cv2.VideoCapture(self.device_index)
-        if not cap.isOpened():
+        self.capture.start()
+        self.capture.opened.wait()
+        if self.capture.failed:
+            self.capture_failed.emit()
+            self.finished.emit()
             return
-            
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        fps = cap.get(cv2.CAP_PROP_FPS) or 30
         
         self.running = True
-        import time
-        self.start_time = time.time()
-        frame_counter = 0
+        self.start_time = self.capture.start_time
+        reported_drops = 0
+        
+        perf = self.perf
+        regions = self.regions
         
+        def metric(image):
+            with perf.stage('metric'):
+                return frame_metric(image, regions)
+        
+        # metrics run on the pool shared by every live session; each session keeps at most queue_depth
+        # frames in it, so the pool's backlog stays bounded however many cameras are running
+        pending = deque()
         while self.running:
-            if not self.paused:
-                ret, frame = cap.read()
-                if not ret:
-                    continue
-                
-                frame_counter += 1
-                if frame_counter % 4 == 0:
-                    if len(frame.shape) == 3:
-                        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    else:
-                        gray = frame.copy()
-                    
-                    flat_image = gray.flatten()
-                    top_100_indices = np.argpartition(flat_image, -100)[-100:]
-                    top_intensity = np.mean(flat_image[top_100_indices])
-                    
-                    p10 = np.percentile(flat_image, 10)
-                    p90 = np.percentile(flat_image, 90)
-                    background_mask = (flat_image >= p10) & (flat_image <= p90)
-                    background_intensity = np.mean(flat_image[background_mask])
-                    
-                    brightness = top_intensity / background_intensity if background_intensity > 0 else 1.0
-                    
-                    current_time = time.time() - self.start_time
-                    self.new_data_point.emit(current_time, brightness)
-                    self.frame_count += 1
-                
-            time.sleep(1.0 / fps)
+            self.emit_results(pending, self.queue_depth - 1)
+            with perf.stage('queue_wait'):
+                item = self.ring.get(timeout=0 if pending else 0.1)
+            if item is None:
+                if self.ring.closed:
+                    break
+                # nothing new to hand out, so wait on the oldest frame in flight instead
+                self.emit_results(pending, len(pending) - 1)
+                continue
+            perf.gauge('queue_depth', len(self.ring))
+            
+            timestamp, frame = item
+            # regions crop the color frame before converting, so only whole-frame sampling converts here
+            with perf.stage('convert'):
+                if regions or frame.ndim == 2:
+                    # measured in place, so the frame's buffer is held until the metric is done
+                    image, held = frame, frame
+                else:
+                    image = to_gray(frame, self.grays.current())
+                    self.grays.commit(image)
+                    self.buffers.release(frame)
+                    held = None
+            pending.append((timestamp, self.pool.submit(metric, image), held))
+            
+            if self.ring.dropped != reported_drops:
+                perf.gauge('dropped', self.ring.dropped)
+                reported_drops = self.ring.dropped
+                self.frames_dropped.emit(reported_drops)
+        
+        if self.running:
+            self.emit_results(pending, 0)
+        for _, future, _ in pending:
+            future.cancel()
         
-        cap.release()
+        self.capture.stop()
+        self.capture.join()
         self.finished.emit()
     
+    def emit_results(self, pending, keep):
+        # results go out in capture order; the oldest is waited for while more than `keep` are in flight
+        while pending and (len(pending) > keep or pending[0][1].done()):
+            timestamp, future, held = pending.popleft()
+            brightness = future.result()
+            self.buffers.release(held)
+            with self.perf.stage('emit'):
+                self.new_data_point.emit(timestamp, brightness)
+            self.frame_count += 1
+    
     def stop(self):
         self.running = False
+        self.capture.stop()
     
     def pause(self):
         self.paused = True
+        self.capture.pause()
     
     def resume(self):
         self.paused = False
+        self.capture.resume()
+
+class LiveSession(QObject):
+    # one camera's live run, with its own capture pipeline, series, layer counter, run log and plot tab
+    def __init__(self, analyzer, device_index):
+        super().__init__()
+        self.analyzer = analyzer
+        self.device_index = device_index
+        self.name = f"Camera {device_index}" if isinstance(device_index, int) else os.path.basename(str(device_index))
+        self.regions = list(analyzer.regions)
+        self.series = TimeSeries(columns=len(self.regions) or None)
+        self.region_names = [region.name for region in self.regions]
+        self.peak_count = 0
+        self.layer_frequency = None
+        # made with the first sample, once the capture knows its frame rate
+        self.oscillation_counter = None
+        self.run_log = None
+        self.running = False
+        self.dropped = 0
+        
+        self.canvas = PlotCanvas()
+        self.canvas.perf = analyzer.perf
+        self.toolbar = NavigationToolbar(self.canvas, None)
+        self.widget = QWidget()
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.toolbar)
+        layout.addWidget(self.canvas, stretch=1)
+        self.widget.setLayout(layout)
+        
+        self.thread = LiveAnalysisThread(analyzer, device_index)
+        self.thread.new_data_point.connect(self.add_data_point)
+        self.thread.frames_dropped.connect(self.update_dropped_frames)
+        self.thread.capture_failed.connect(self.capture_failed)
+        self.thread.finished.connect(self.thread_finished)
+    
+    @property
+    def time_points(self):
+        return self.series.times
+    
+    @property
+    def brightness_values(self):
+        return self.series.column(0)
+    
+    @property
+    def paused(self):
+        return self.thread.paused
+    
+    def start(self):
+        try:
+            self.run_log = RunLog.create(self.analyzer.lattice_constant, self.name, self.analyzer.run_log_dir,
+                                         columns=len(self.regions) or None)
+        except OSError as e:
+            print(f"Error creating run log: {e}")
+            self.run_log = None
+        self.running = True
+        self.canvas.start_live(self)
+        self.thread.start()
+    
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.thread.stop()
+        self.thread.wait()
+        
+        if len(self.series):
+            self.peak_count = self.analyzer.count_layers(self)
+        self.canvas.stop_live()
+        
+        if self.run_log:
+            self.run_log.close(self.analyzer.lattice_constant)
+            self.run_log = None
+            prune_closed_logs(self.analyzer.run_log_dir)
+    
+    def pause(self):
+        self.thread.pause()
+    
+    def resume(self):
+        self.thread.resume()
+    
+    def recount(self):
+        if self.running:
+            # replay the run so far into the new counter; samples keep arriving on this thread meanwhile
+            self.oscillation_counter = None
+            if len(self.series):
+                self.oscillation_counter = self.new_layer_counter()
+                self.peak_count = self.oscillation_counter.extend(self.brightness_values, self.time_points)
+                self.layer_frequency = getattr(self.oscillation_counter, 'frequency', None)
+        elif len(self.series):
+            self.peak_count = self.analyzer.count_layers(self)
+    
+    def new_layer_counter(self):
+        counter = self.analyzer.new_layer_counter()
+        capture = self.thread.capture
+        if capture.sampler.mode == 'adaptive':
+            # adaptive sampling leaves uneven gaps; the counter sees the run as if sampled at the highest rate
+            return ResampledCounter(counter, capture.sampler.stride / capture.fps)
+        return counter
+    
+    def add_data_point(self, time_point, brightness):
+        if not self.running:
+            return
+        perf = self.analyzer.perf
+        if perf.enabled and self.thread.start_time is not None:
+            # capture to GUI thread, including the time the sample spent in the Qt event queue
+            perf.record('delivery', time.perf_counter() - self.thread.start_time - time_point)
+        
+        with perf.stage('sample'):
+            with perf.stage('append'):
+                self.series.append(time_point, brightness)
+                if self.run_log:
+                    self.run_log.append(time_point, brightness)
+            with perf.stage('count'):
+                if self.oscillation_counter is None:
+                    self.oscillation_counter = self.new_layer_counter()
+                self.peak_count = self.oscillation_counter.update(
+                    brightness[0] if self.series.columns else brightness, time_point)
+                self.layer_frequency = getattr(self.oscillation_counter, 'frequency', None)
+            
+            if self.analyzer.publisher:
+                with perf.stage('publish'):
+                    self.analyzer.publisher.publish(self.name, self.device_index, time_point, brightness,
+                                                    self.peak_count, self.growth_rate())
+            
+            with perf.stage('display'):
+                self.canvas.add_live_data_point(time_point, brightness)
+                if self.analyzer.current_view() is self:
+                    self.analyzer.update_info_display()
+    
+    def growth_rate(self):
+        # the current rate when the estimator tracks one, otherwise the average over the run
+        lattice_constant = self.analyzer.lattice_constant
+        if self.layer_frequency:
+            return growth_rate_from_frequency(self.layer_frequency, lattice_constant)
+        return growth_summary(self.series.time_max, self.peak_count, lattice_constant)[1]
+    
+    def update_dropped_frames(self, dropped):
+        self.dropped = dropped
+        if self.analyzer.current_view() is self:
+            self.analyzer.progress_label.setText(f'Dropped: {dropped}')
+    
+    def capture_failed(self):
+        # most likely a camera unplugged since the device list was last scanned, or busy elsewhere
+        print(f"Error opening {self.name}")
+        analyzer = self.analyzer
+        analyzer.close_session_tab(analyzer.plot_tabs.indexOf(self.widget))
+        if isinstance(self.device_index, int):
+            analyzer.refresh_devices()
+        QMessageBox.warning(analyzer, 'Live Analysis', f"Could not open {self.name}. The camera list is being "
+                                                       f"refreshed.")
+    
+    def thread_finished(self):
+        # the camera went away or the stream ended
+        if self.running:
+            self.analyzer.stop_live_analysis(self.device_index)
+    
+    def export(self, file_path):
+        names = [region.name for region in self.regions]
+        regions = self.regions if names == self.region_names else self.region_names
+        export_series(file_path, self.time_points, self.series.values,
+                      self.peak_count, self.analyzer.lattice_constant, regions)
+
+class DeviceDiscoveryThread(QThread):
+    devices_found = Signal(object)
+    
+    def __init__(self, known=None, cache_path=None):
+        super().__init__()
+        self.known = known or {}
+        self.cache_path = cache_path
+    
+    def run(self):
+        devices = discover_devices(known=self.known)
+        try:
+            save_device_cache(devices, self.cache_path)
+        except OSError as e:
+            print(f"Error saving device list: {e}")
+        self.devices_found.emit(devices)
 
 class AnalysisThread(QThread):
     progress = Signal(int)
+    failed = Signal()
     finished = Signal()
     
-    def __init__(self, rheed_analyzer):
+    def __init__(self, rheed_analyzer, cache_key=None, checkpoint=None):
         super().__init__()
         self.analyzer = rheed_analyzer
+        self.cache_key = cache_key
+        self.checkpoint = checkpoint
+        self.stop_event = threading.Event()
     
     def run(self):
-        cap = cv2.VideoCapture(self.analyzer.video_path)
-        if not cap.isOpened():
+        run_log = self.analyzer.run_log
+        options = dict(progress=self.progress.emit,
+                       workers=self.analyzer.analysis_workers,
+                       queue_depth=self.analyzer.analysis_queue_depth,
+                       segments=self.analyzer.analysis_segments,
+                       sampler=self.analyzer.sampler,
+                       on_sample=run_log.append if run_log else None,
+                       regions=self.analyzer.regions or None,
+                       stop=self.stop_event,
+                       perf=self.analyzer.perf)
+        if self.checkpoint:
+            result = checkpointed_analyze_video(self.analyzer.video_path, self.checkpoint,
+                                                on_resume=run_log.extend if run_log else None, **options)
+        else:
+            result = analyze_video(self.analyzer.video_path, **options)
+        if result is None:
+            # stopped when the window closed, or the video could not be opened or decoded
+            if not self.stop_event.is_set():
+                # nothing worth resuming, and a kept checkpoint would be offered again for the same bad file
+                if self.checkpoint:
+                    self.checkpoint.discard()
+                self.failed.emit()
             return
         
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        frame_count = 0
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            if frame_count % 4 == 0:
-                if len(frame.shape) == 3:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                else:
-                    gray = frame.copy()
-                
-                flat_image = gray.flatten()
-                top_100_indices = np.argpartition(flat_image, -100)[-100:]
-                top_intensity = np.mean(flat_image[top_100_indices])
-                
-                p10 = np.percentile(flat_image, 10)
-                p90 = np.percentile(flat_image, 90)
-                background_mask = (flat_image >= p10) & (flat_image <= p90)
-                background_intensity = np.mean(flat_image[background_mask])
-                
-                brightness = top_intensity / background_intensity if background_intensity > 0 else 1.0
-                
-                self.analyzer.time_points.append(frame_count / fps)
-                self.analyzer.brightness_values.append(brightness)
-            
-            frame_count += 1
-            
-            if frame_count % max(1, total_frames // 100) == 0:
-                progress_percent = int((frame_count / total_frames) * 100)
-                self.progress.emit(progress_percent)
+        if self.cache_key:
+            try:
+                self.analyzer.analysis_cache.put(self.cache_key, *result, source=self.analyzer.video_path)
+            except OSError as e:
+                print(f"Error caching analysis: {e}")
         
-        cap.release()
+        self.analyzer.series = TimeSeries.from_arrays(*result)
+        self.analyzer.region_names = [region.name for region in self.analyzer.regions]
         
-        self.analyzer.peak_count = count_rheed_oscillations(
-            self.analyzer.brightness_values, 
-            self.analyzer.time_points
-        )
+        self.analyzer.peak_count = self.analyzer.count_layers()
         
         self.finished.emit()
+    
+    def stop(self):
+        self.stop_event.set()
 
 class PlotCanvas(FigureCanvas):
     def __init__(self, parent=None):
@@ -254,83 +495,221 @@ class PlotCanvas(FigureCanvas):
         self.setParent(parent)
         self.ax = self.fig.add_subplot(111)
         self.analyzer = None
+        self.line = None
+        self.live_mode = False
+        self.live_dirty = False
+        self.background = None
+        self.lods = []
+        self.hover_index = None
+        self.perf = Instrumentation()
         
         self.fig.patch.set_facecolor('white')
         self.ax.set_facecolor('white')
         
         self.mpl_connect('motion_notify_event', self.on_hover)
+        self.mpl_connect('draw_event', self.on_draw)
+        self.mpl_connect('resize_event', self.on_resize)
         
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(1000 // LIVE_REFRESH_HZ)
+        self.live_timer.timeout.connect(self.refresh_live)
+        
+        self.create_annotation()
+    
+    def create_annotation(self):
         self.annotation = self.ax.annotate('', xy=(0,0), xytext=(20,20), 
                                          textcoords="offset points",
                                          bbox=dict(boxstyle="round", fc="white", alpha=0.9, edgecolor='gray'),
-                                         arrowprops=dict(arrowstyle="->"))
+                                         arrowprops=dict(arrowstyle="->"), animated=True)
         self.annotation.set_visible(False)
     
+    def reset_axes(self):
+        self.ax.clear()
+        self.create_annotation()
+        self.ax.set_title('RHEED Growth', fontsize=18, fontweight='bold', pad=20)
+        self.ax.set_xlabel('Time (s)', fontsize=14)
+        self.ax.set_ylabel('Intensity (%)', fontsize=14)
+        self.ax.grid(True, alpha=0.3)
+        self.ax.set_ylim(0, 100)
+        self.ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+        self.lods = []
+    
+    def add_lod_line(self, times, values, **style):
+        # each line draws from a min/max pyramid of its series, at the detail the view needs
+        lod = SmoothedPyramid()
+        lod.update(times, values)
+        line, = self.ax.plot(*lod.view(-np.inf, np.inf, self.ax.bbox.width), **style)
+        self.lods.append((line, lod))
+        return line
+    
+    def update_lod(self):
+        x_min, x_max = self.ax.get_xlim()
+        pixels = self.ax.bbox.width
+        for line, lod in self.lods:
+            line.set_data(*lod.view(x_min, x_max, pixels))
+        self.hover_index = None
+    
+    def on_xlim_changed(self, ax):
+        # pan and zoom: the toolbar redraws after this, with the lines re-decimated for the new range
+        self.update_lod()
+    
+    def plotted_series(self):
+        # the points as drawn, so hovering snaps to a vertex on the screen
+        time_points, normalized = self.line.get_data()
+        return np.asarray(time_points), np.asarray(normalized)
+    
+    def hovered_index(self, event):
+        time_points, normalized = self.plotted_series()
+        index = int(np.clip(np.searchsorted(time_points, event.xdata), 0, len(time_points) - 1))
+        if index > 0 and event.xdata - time_points[index - 1] < time_points[index] - event.xdata:
+            index -= 1
+        
+        # distance to the segments either side of the nearest vertex, as Line2D.contains would measure it
+        lo, hi = max(0, index - 1), min(len(time_points), index + 2)
+        points = self.ax.transData.transform(np.column_stack((time_points[lo:hi], normalized[lo:hi])))
+        cursor = np.array([event.x, event.y])
+        if len(points) == 1:
+            distance = np.hypot(*(points[0] - cursor))
+        else:
+            starts, ends = points[:-1], points[1:]
+            direction = ends - starts
+            length_sq = np.maximum(np.sum(direction ** 2, axis=1), 1e-12)
+            t = np.clip(np.sum((cursor - starts) * direction, axis=1) / length_sq, 0, 1)
+            closest = starts + t[:, None] * direction
+            distance = np.min(np.hypot(*(closest - cursor).T))
+        
+        return index if distance <= self.line.get_pickradius() else None
+    
     def on_hover(self, event):
-        if event.inaxes != self.ax or not self.analyzer:
-            self.annotation.set_visible(False)
+        index = None
+        if event.inaxes == self.ax and self.analyzer and self.line is not None and len(self.analyzer.brightness_values):
+            index = self.hovered_index(event)
+        
+        if index is None:
+            if self.annotation.get_visible():
+                self.annotation.set_visible(False)
+                self.blit_overlays()
+            return
+        
+        if self.annotation.get_visible() and index == self.hover_index:
+            return
+        
+        time_points, normalized = self.plotted_series()
+        x, y = time_points[index], normalized[index]
+        self.hover_index = index
+        self.annotation.xy = (x, y)
+        self.annotation.set_text(f'Time: {x:.2f}s\nIntensity: {y:.1f}%')
+        self.annotation.set_visible(True)
+        self.blit_overlays()
+    
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        self.draw_overlays()
+    
+    def draw_overlays(self):
+        if self.live_mode:
+            for line, _ in self.lods:
+                self.ax.draw_artist(line)
+        if self.annotation.get_visible():
+            self.ax.draw_artist(self.annotation)
+    
+    def blit_overlays(self):
+        if self.background is None:
             self.draw_idle()
             return
         
-        if hasattr(self, 'line') and self.line:
-            cont, ind = self.line.contains(event)
-            if cont:
-                x = self.analyzer.time_points[ind['ind'][0]]
-                
-                smoothed = savgol_filter(self.analyzer.brightness_values, window_length=min(11, len(self.analyzer.brightness_values)), polyorder=3)
-                min_val = np.min(smoothed)
-                max_val = np.max(smoothed)
-                if max_val > min_val:
-                    y = ((smoothed[ind['ind'][0]] - min_val) / (max_val - min_val)) * 100
-                else:
-                    y = 50
-                
-                self.annotation.xy = (x, y)
-                self.annotation.set_text(f'Time: {x:.2f}s\nIntensity: {y:.1f}%')
-                self.annotation.set_visible(True)
-                self.draw_idle()
-            else:
-                self.annotation.set_visible(False)
-                self.draw_idle()
+        self.restore_region(self.background)
+        self.draw_overlays()
+        self.blit(self.fig.bbox)
+    
+    def on_resize(self, event):
+        self.background = None
+        self.fig.tight_layout()
+        self.update_lod()
+    
+    def start_live(self, analyzer):
+        self.analyzer = analyzer
+        self.live_mode = True
+        self.live_dirty = False
+        self.background = None
+        
+        self.reset_axes()
+        self.line = self.add_lod_line([], [], linewidth=2, color=REGION_COLORS[0], picker=True, pickradius=5,
+                                      animated=True)
+        names = analyzer.region_names
+        if analyzer.series.columns:
+            self.line.set_label(names[0])
+            for i in range(1, analyzer.series.columns):
+                self.add_lod_line([], [], linewidth=1.5, color=REGION_COLORS[i % len(REGION_COLORS)],
+                                  label=names[i], animated=True)
+            self.ax.legend(loc='upper right')
+        self.ax.set_xlim(0, LIVE_WINDOW_S)
+        self.fig.tight_layout()
+        self.draw_idle()
+        self.live_timer.start()
+    
+    def stop_live(self):
+        self.live_timer.stop()
+        self.live_mode = False
+        self.background = None
+        if self.analyzer is not None:
+            self.plot_data(self.analyzer)
     
     def add_live_data_point(self, time_point, brightness):
-        if len(self.analyzer.brightness_values) > 20:
-            self.analyzer.peak_count = count_rheed_oscillations(
-                self.analyzer.brightness_values, 
-                self.analyzer.time_points
-            )
+        self.live_dirty = True
+    
+    def refresh_live(self):
+        if not self.live_dirty or not len(self.analyzer.brightness_values):
+            return
+        self.live_dirty = False
         
-        self.plot_data(self.analyzer)
+        with self.perf.stage('redraw'):
+            series = self.analyzer.series
+            time_points = series.times
+            for i, (_, lod) in enumerate(self.lods):
+                lod.update(time_points, series.column(i))
+            
+            # scroll in jumps with headroom so most refreshes can reuse the cached background
+            latest = time_points[-1]
+            if latest > self.ax.get_xlim()[1]:
+                x_max = latest + LIVE_WINDOW_S * 0.25
+                self.ax.set_xlim(max(0, x_max - LIVE_WINDOW_S), x_max)
+                self.background = None
+            else:
+                self.update_lod()
+            
+            self.blit_overlays()
     
     def plot_data(self, analyzer):
+        with self.perf.stage('plot'):
+            self._plot_data(analyzer)
+    
+    def _plot_data(self, analyzer):
         self.analyzer = analyzer
-        self.ax.clear()
+        self.reset_axes()
         
-        if not analyzer.brightness_values:
+        if not len(analyzer.brightness_values):
+            self.line = None
+            self.draw_idle()
             return
         
-        smoothed = savgol_filter(analyzer.brightness_values, window_length=min(11, len(analyzer.brightness_values)), polyorder=3)
+        time_points = analyzer.time_points
+        self.line = self.add_lod_line(time_points, analyzer.brightness_values,
+                                      linewidth=2, color=REGION_COLORS[0], picker=True, pickradius=5)
         
-        min_val = np.min(smoothed)
-        max_val = np.max(smoothed)
-        if max_val > min_val:
-            smoothed_normalized = ((smoothed - min_val) / (max_val - min_val)) * 100
-        else:
-            smoothed_normalized = smoothed * 0 + 50
+        names = analyzer.region_names
+        if analyzer.series.columns:
+            self.line.set_label(names[0])
+            for i in range(1, analyzer.series.columns):
+                self.add_lod_line(time_points, analyzer.series.column(i), linewidth=1.5,
+                                  color=REGION_COLORS[i % len(REGION_COLORS)], label=names[i])
+            self.ax.legend(loc='upper right')
         
-        self.line, = self.ax.plot(analyzer.time_points, smoothed_normalized, 
-                                 linewidth=2, color='#1f3a93', picker=True, pickradius=5)
-        
-        self.ax.set_title('RHEED Growth', fontsize=18, fontweight='bold', pad=20)
-        self.ax.set_xlabel('Time (s)', fontsize=14)
-        self.ax.set_ylabel('Intensity (%)', fontsize=14)
-        self.ax.grid(True, alpha=0.3)
-        self.ax.set_ylim(0, 100)
-        
-        if len(analyzer.time_points) > 100:
-            self.ax.set_xlim(max(0, max(analyzer.time_points) - 60), max(analyzer.time_points))
+        if len(time_points) > 100:
+            self.ax.set_xlim(max(0, time_points[-1] - 60), time_points[-1])
         
         self.fig.tight_layout()
+        self.update_lod()
         self.draw()
 
 class RHEED(QMainWindow):
@@ -338,15 +717,50 @@ class RHEED(QMainWindow):
         super().__init__()
         self.video_path = ""
         self.lattice_constant = 3.5
-        self.time_points = []
-        self.brightness_values = []
+        self.series = TimeSeries()
         self.peaks = None
         self.peak_count = 0
-        self.live_thread = None
-        self.is_live_mode = False
+        self.live_sessions = []
+        self.live_workers = max(1, (os.cpu_count() or 1) - 1)
+        self.live_queue_depth = 2
+        self.metric_pool = ThreadPoolExecutor(max_workers=self.live_workers)
+        self.analysis_workers = max(1, (os.cpu_count() or 1) - 1)
+        self.analysis_queue_depth = None
+        self.analysis_segments = 1
+        self.sampler = FrameSampler()
+        self.live_ring_capacity = DEFAULT_RING_CAPACITY
+        self.live_drop_policy = DROP_OLDEST
+        self.live_fourcc = os.environ.get('GANDIVA_CAMERA_FOURCC') or None
+        self.live_gray = os.environ.get('GANDIVA_CAMERA_GRAY') == '1'
+        self.estimator = 'zero-crossing'
+        self.layer_frequency = None
+        self.run_log = None
+        self.run_log_dir = default_run_dir()
+        self.regions = []
+        self.region_names = []
+        self.analysis_cache = AnalysisCache()
+        self.use_cache = True
+        self.analysis_thread = None
+        self.checkpoint_dir = default_checkpoint_dir()
+        self.perf = Instrumentation(enabled=os.environ.get('GANDIVA_PERF') == '1')
+        self.device_cache_path = default_device_cache()
+        self.devices = load_device_cache(self.device_cache_path)
+        self.device_thread = None
+        self.rescan_pending = False
+        self.known_video_nodes = video_nodes()
+        self.publisher = None
         
         self.initUI()
     
+    @property
+    def time_points(self):
+        return self.series.times
+    
+    @property
+    def brightness_values(self):
+        # layers are always counted on the first region
+        return self.series.column(0)
+    
     def initUI(self):
         self.setWindowTitle('Gandiva - by Hume Nano')
         try:
@@ -363,10 +777,24 @@ class RHEED(QMainWindow):
         layout.setSpacing(5)
         
         self.canvas = PlotCanvas(self)
+        self.canvas.perf = self.perf
         self.toolbar = NavigationToolbar(self.canvas, self)
         
-        layout.addWidget(self.toolbar)
-        layout.addWidget(self.canvas, stretch=1)
+        analysis_layout = QVBoxLayout()
+        analysis_layout.setContentsMargins(0, 0, 0, 0)
+        analysis_layout.addWidget(self.toolbar)
+        analysis_layout.addWidget(self.canvas, stretch=1)
+        self.analysis_tab = QWidget()
+        self.analysis_tab.setLayout(analysis_layout)
+        
+        # the first tab holds file analyses and imports, every live session gets a tab of its own
+        self.plot_tabs = QTabWidget()
+        self.plot_tabs.addTab(self.analysis_tab, 'Analysis')
+        self.plot_tabs.setTabsClosable(True)
+        self.plot_tabs.tabBar().setTabButton(0, QTabBar.ButtonPosition.RightSide, None)
+        self.plot_tabs.tabCloseRequested.connect(self.close_session_tab)
+        self.plot_tabs.currentChanged.connect(self.view_changed)
+        layout.addWidget(self.plot_tabs, stretch=1)
         
         controls_layout = QHBoxLayout()
         controls_layout.setSpacing(50)
@@ -389,7 +817,7 @@ class RHEED(QMainWindow):
         controls_layout.addWidget(self.load_button)
         
         self.device_combo = QComboBox()
-        self.populate_video_devices()
+        self.device_combo.currentTextChanged.connect(self.update_live_controls)
         self.device_combo.setStyleSheet("""
             QComboBox {
                 padding: 5px;
@@ -401,6 +829,23 @@ class RHEED(QMainWindow):
         """)
         controls_layout.addWidget(self.device_combo)
         
+        self.rescan_button = QPushButton('Rescan')
+        self.rescan_button.clicked.connect(self.refresh_devices)
+        self.rescan_button.setStyleSheet("""
+            QPushButton {
+                padding: 5px 10px;
+                border: 1px solid #bdc3c7;
+                border-radius: 3px;
+                background-color: white;
+            }
+        """)
+        controls_layout.addWidget(self.rescan_button)
+        
+        # new /dev/video nodes mean a camera was plugged in or removed
+        if self.known_video_nodes is not None:
+            self.device_watcher = QFileSystemWatcher(['/dev'], self)
+            self.device_watcher.directoryChanged.connect(self.check_video_nodes)
+        
         self.live_button = QPushButton('Start Live')
         self.live_button.clicked.connect(self.toggle_live_analysis)
         self.live_button.setStyleSheet("""
@@ -463,11 +908,65 @@ class RHEED(QMainWindow):
         lattice_widget.setLayout(lattice_container)
         controls_layout.addWidget(lattice_widget)
         
+        sampling_container = QHBoxLayout()
+        sampling_container.setSpacing(10)
+        sampling_container.addWidget(QLabel('Sampling:'))
+        self.sampling_combo = QComboBox()
+        self.sampling_combo.addItems(list(SAMPLING_PRESETS))
+        self.sampling_combo.setCurrentText(DEFAULT_SAMPLING_PRESET)
+        self.sampling_combo.currentTextChanged.connect(self.update_sampling)
+        self.sampling_combo.setStyleSheet("""
+            QComboBox {
+                padding: 5px;
+                border: 1px solid #bdc3c7;
+                border-radius: 3px;
+                background-color: white;
+                min-width: 120px;
+            }
+        """)
+        sampling_container.addWidget(self.sampling_combo)
+        
+        sampling_container.addWidget(QLabel('Layers:'))
+        self.estimator_combo = QComboBox()
+        self.estimator_combo.addItems(list(ESTIMATOR_PRESETS))
+        self.estimator_combo.currentTextChanged.connect(self.update_estimator)
+        self.estimator_combo.setStyleSheet("""
+            QComboBox {
+                padding: 5px;
+                border: 1px solid #bdc3c7;
+                border-radius: 3px;
+                background-color: white;
+                min-width: 110px;
+            }
+        """)
+        sampling_container.addWidget(self.estimator_combo)
+        
+        self.regions_button = QPushButton('Regions')
+        self.regions_button.clicked.connect(self.edit_regions)
+        self.regions_button.setStyleSheet("""
+            QPushButton {
+                padding: 5px 10px;
+                border: 1px solid #bdc3c7;
+                border-radius: 3px;
+                background-color: white;
+            }
+        """)
+        sampling_container.addWidget(self.regions_button)
+        
+        self.cache_checkbox = QCheckBox('Use cache')
+        self.cache_checkbox.setChecked(self.use_cache)
+        self.cache_checkbox.toggled.connect(self.update_use_cache)
+        sampling_container.addWidget(self.cache_checkbox)
+        
+        sampling_widget = QWidget()
+        sampling_widget.setLayout(sampling_container)
+        controls_layout.addWidget(sampling_widget)
+        
         export_container = QHBoxLayout()
         export_container.setSpacing(10)
         
         self.export_combo = QComboBox()
-        self.export_combo.addItems(['Export Data', 'Import Data'])
+        self.export_combo.addItems(['Export Data', 'Import Data', 'Export Trace'])
         self.export_combo.setStyleSheet("""
             QComboBox {
                 padding: 5px;
@@ -516,170 +1015,367 @@ class RHEED(QMainWindow):
         """)
         controls_layout.addWidget(self.info_label)
         
+        self.perf_label = QLabel('')
+        self.perf_label.setStyleSheet("color: #7f8c8d; font-size: 11px;")
+        self.perf_label.setVisible(self.perf.enabled)
+        controls_layout.addWidget(self.perf_label)
+        
+        self.perf_timer = QTimer(self)
+        self.perf_timer.setInterval(PERF_REFRESH_MS)
+        self.perf_timer.timeout.connect(self.update_perf_display)
+        if self.perf.enabled:
+            self.perf_timer.start()
+        
+        self.perf_shortcut = QShortcut(QKeySequence('F12'), self)
+        self.perf_shortcut.activated.connect(self.toggle_instrumentation)
+        
+        self.populate_video_devices()
+        
         layout.addLayout(controls_layout)
         central_widget.setLayout(layout)
     
     def populate_video_devices(self):
+        # the list from the last launch is shown straight away and replaced once the cameras have been probed
+        self.fill_device_combo()
+        self.refresh_devices()
+    
+    def fill_device_combo(self):
+        selected = self.selected_device()
         self.device_combo.clear()
         self.device_combo.addItem("Select Camera...")
-        for i in range(5):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                self.device_combo.addItem(f"Camera {i}")
-                cap.release()
+        for info in self.devices:
+            self.device_combo.addItem(describe_device(info), info['index'])
+        index = self.device_combo.findData(selected) if selected is not None else -1
+        if index >= 0:
+            self.device_combo.setCurrentIndex(index)
+    
+    def refresh_devices(self):
+        if self.device_thread and self.device_thread.isRunning():
+            self.rescan_pending = True
+            return
+        
+        # a camera streaming to a live session may refuse a second open, so it keeps its last known entry
+        listed = {info['index']: info for info in self.devices}
+        known = {session.device_index: listed.get(session.device_index, {'index': session.device_index})
+                 for session in self.live_sessions if session.running and isinstance(session.device_index, int)}
+        self.rescan_button.setEnabled(False)
+        self.device_thread = DeviceDiscoveryThread(known, self.device_cache_path)
+        self.device_thread.devices_found.connect(self.devices_updated)
+        self.device_thread.start()
+    
+    def devices_updated(self, devices):
+        self.devices = devices
+        self.fill_device_combo()
+        self.rescan_button.setEnabled(True)
+        if self.rescan_pending:
+            self.rescan_pending = False
+            self.refresh_devices()
+    
+    def check_video_nodes(self, path):
+        nodes = video_nodes()
+        if nodes != self.known_video_nodes:
+            self.known_video_nodes = nodes
+            # udev needs a moment to set permissions on a new node before it can be opened
+            QTimer.singleShot(HOTPLUG_SETTLE_MS, self.refresh_devices)
+    
+    def selected_device(self):
+        return self.device_combo.currentData()
+    
+    def running_session(self, device_index):
+        for session in self.live_sessions:
+            if session.running and session.device_index == device_index:
+                return session
+        return None
+    
+    def current_view(self):
+        # the live session shown in the selected tab, or this window for the analysis tab
+        widget = self.plot_tabs.currentWidget()
+        for session in self.live_sessions:
+            if session.widget is widget:
+                return session
+        return self
+    
+    def view_changed(self, index):
+        view = self.current_view()
+        if view is not self and self.device_combo.findData(view.device_index) >= 0:
+            self.device_combo.setCurrentIndex(self.device_combo.findData(view.device_index))
+        self.progress_label.setText(f'Dropped: {view.dropped}' if view is not self and view.dropped else '')
+        self.update_live_controls()
+        self.update_info_display()
     
     def toggle_live_analysis(self):
-        if not self.is_live_mode:
-            device_text = self.device_combo.currentText()
-            if device_text == "Select Camera...":
-                return
-            
-            device_index = int(device_text.split()[-1])
-            self.start_live_analysis(device_index)
+        device_index = self.selected_device()
+        if device_index is None:
+            return
+        
+        if self.running_session(device_index):
+            self.stop_live_analysis(device_index)
         else:
-            self.stop_live_analysis()
+            self.start_live_analysis(device_index)
     
     def start_live_analysis(self, device_index):
-        self.time_points = []
-        self.brightness_values = []
-        self.peaks = None
-        self.peak_count = 0
-        self.is_live_mode = True
-        
-        self.canvas.analyzer = self
-        
-        self.live_thread = LiveAnalysisThread(self, device_index)
-        self.live_thread.new_data_point.connect(self.add_live_data_point)
-        self.live_thread.finished.connect(self.live_analysis_finished)
-        self.live_thread.start()
+        if self.running_session(device_index):
+            return
+        if not self.live_sessions:
+            self.perf.reset()
         
-        self.live_button.setText('Stop Live')
-        self.live_button.setStyleSheet("""
-            QPushButton {
-                background-color: #27ae60;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #229954;
-            }
-        """)
-        self.pause_button.setVisible(True)
-        self.load_button.setEnabled(False)
-        self.device_combo.setEnabled(False)
+        session = LiveSession(self, device_index)
+        self.live_sessions.append(session)
+        self.plot_tabs.addTab(session.widget, session.name)
+        self.plot_tabs.setCurrentWidget(session.widget)
+        session.start()
+        self.update_live_controls()
     
-    def stop_live_analysis(self):
-        if self.live_thread:
-            self.live_thread.stop()
-            self.live_thread.wait()
-        
-        self.is_live_mode = False
-        self.live_button.setText('Start Live')
-        self.live_button.setStyleSheet("""
-            QPushButton {
-                background-color: #e74c3c;
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #c0392b;
-            }
-        """)
-        self.pause_button.setVisible(False)
-        self.load_button.setEnabled(True)
-        self.device_combo.setEnabled(True)
+    def stop_live_analysis(self, device_index=None):
+        # stops one camera's session, or every session when no camera is given
+        for session in self.live_sessions:
+            if device_index is None or session.device_index == device_index:
+                session.stop()
+        self.update_live_controls()
+        self.update_info_display()
     
     def pause_live_analysis(self):
-        if self.live_thread:
-            if self.pause_button.text() == 'Pause':
-                self.live_thread.pause()
-                self.pause_button.setText('Resume')
+        session = self.running_session(self.selected_device())
+        if session:
+            if session.paused:
+                session.resume()
             else:
-                self.live_thread.resume()
-                self.pause_button.setText('Pause')
+                session.pause()
+        self.update_live_controls()
     
-    def add_live_data_point(self, time_point, brightness):
-        self.time_points.append(time_point)
-        self.brightness_values.append(brightness)
-        
-        if len(self.brightness_values) > 20:
-            self.peak_count = count_rheed_oscillations(
-                self.brightness_values, 
-                self.time_points
-            )
-        
-        self.canvas.add_live_data_point(time_point, brightness)
-        self.update_info_display()
+    def close_session_tab(self, index):
+        widget = self.plot_tabs.widget(index)
+        for session in self.live_sessions:
+            if session.widget is widget:
+                session.stop()
+                self.live_sessions.remove(session)
+                self.plot_tabs.removeTab(index)
+                widget.deleteLater()
+                break
+        self.update_live_controls()
     
-    def live_analysis_finished(self):
-        self.stop_live_analysis()
+    def update_live_controls(self):
+        session = self.running_session(self.selected_device())
+        if session:
+            self.live_button.setText('Stop Live')
+            self.live_button.setStyleSheet("""
+                QPushButton {
+                    background-color: #27ae60;
+                    color: white;
+                    border: none;
+                    padding: 8px 16px;
+                    border-radius: 4px;
+                    font-weight: bold;
+                }
+                QPushButton:hover {
+                    background-color: #229954;
+                }
+            """)
+            self.pause_button.setText('Resume' if session.paused else 'Pause')
+        else:
+            self.live_button.setText('Start Live')
+            self.live_button.setStyleSheet("""
+                QPushButton {
+                    background-color: #e74c3c;
+                    color: white;
+                    border: none;
+                    padding: 8px 16px;
+                    border-radius: 4px;
+                    font-weight: bold;
+                }
+                QPushButton:hover {
+                    background-color: #c0392b;
+                }
+            """)
+        self.pause_button.setVisible(session is not None)
     
     def load_video(self):
         file_path, _ = QFileDialog.getOpenFileName(self, 'Open Video File', '', 
                                                   'Video Files (*.mp4 *.avi *.mov *.mkv);;All Files (*)')
         if file_path:
+            self.plot_tabs.setCurrentWidget(self.analysis_tab)
             self.video_path = file_path
-            self.time_points = []
-            self.brightness_values = []
+            self.series = TimeSeries()
             self.peaks = None
             self.peak_count = 0
             
+            try:
+                key = analysis_key(file_path, analysis_parameters(self.sampler, self.regions))
+            except OSError as e:
+                print(f"Error reading video: {e}")
+                key = None
+            
+            cached = self.analysis_cache.get(key) if key and self.use_cache else None
+            if cached is not None:
+                self.series = TimeSeries.from_arrays(*cached, copy=False)
+                self.region_names = [region.name for region in self.regions]
+                self.peak_count = self.count_layers()
+                self.analysis_complete()
+                return
+            
+            checkpoint = Checkpoint(key, self.checkpoint_dir) if key and not self.sampler.sequential else None
+            partial = checkpoint.load() if checkpoint else None
+            if partial is not None:
+                answer = QMessageBox.question(
+                    self, 'Resume Analysis',
+                    f"An earlier analysis of this video stopped after {partial[0][-1]:.0f} s "
+                    f"({len(partial[0])} samples).\nResume from there?")
+                if answer != QMessageBox.StandardButton.Yes:
+                    checkpoint.discard()
+            
             self.progress_label.setText('0%')
+            self.perf.reset()
+            self.start_run_log(file_path, len(self.regions))
             
-            self.analysis_thread = AnalysisThread(self)
+            self.analysis_thread = AnalysisThread(self, key if self.use_cache else None, checkpoint)
             self.analysis_thread.progress.connect(self.update_progress)
             self.analysis_thread.finished.connect(self.analysis_complete)
+            self.analysis_thread.failed.connect(self.analysis_failed)
             self.analysis_thread.start()
     
     def update_progress(self, progress):
         self.progress_label.setText(f'{progress}%')
     
+    def update_sampling(self, preset):
+        self.sampler = FrameSampler(*SAMPLING_PRESETS[preset])
+    
+    def update_estimator(self, preset):
+        self.estimator = ESTIMATOR_PRESETS[preset]
+        for session in self.live_sessions:
+            session.recount()
+        if len(self.series):
+            self.peak_count = self.count_layers()
+        self.update_info_display()
+    
+    def new_layer_counter(self):
+        if self.estimator == 'spectral':
+            return SlidingSpectrum()
+        return StreamingOscillationCounter()
+    
+    def count_layers(self, view=None):
+        # the spectral estimator also reports the current oscillation frequency, from the last few periods
+        view = view or self
+        view.layer_frequency = None
+        if self.estimator == 'spectral':
+            _, frequencies = frequency_track(*even_series(view.brightness_values, view.time_points))
+            if len(frequencies):
+                view.layer_frequency = frequencies[-1]
+        return count_layers(view.brightness_values, view.time_points, self.estimator)
+    
+    def edit_regions(self):
+        text, ok = QInputDialog.getMultiLineText(
+            self, 'Regions of Interest',
+            'One region per line, layers are counted on the first. Leave empty to use the whole frame.\n'
+            'Rectangle: name=x,y,width,height    Polygon: name=x1,y1;x2,y2;x3,y3',
+            '\n'.join(str(region) for region in self.regions))
+        if not ok:
+            return
+        try:
+            self.regions = parse_regions(text)
+        except ValueError as e:
+            QMessageBox.warning(self, 'Regions of Interest', str(e))
+    
+    def update_use_cache(self, checked):
+        self.use_cache = checked
+    
     def update_lattice_constant(self, value):
         self.lattice_constant = value
-        if self.brightness_values:
+        if len(self.series):
             self.canvas.plot_data(self)
-            self.update_info_display()
+        self.update_info_display()
     
     def analysis_complete(self):
+        self.close_run_log()
         self.progress_label.setText('')
         self.canvas.plot_data(self)
         self.update_info_display()
     
+    def analysis_failed(self):
+        # closed so the empty log is not offered for recovery at the next start
+        self.close_run_log()
+        self.progress_label.setText('')
+        QMessageBox.warning(self, 'Analysis', f"Could not read {os.path.basename(self.video_path)}.")
+    
     def update_info_display(self):
-        if self.time_points:
-            total_time_hrs = max(self.time_points) / 3600 if self.time_points else 0
-            thickness_nm = (self.peak_count * self.lattice_constant) / 10
-            growth_rate = thickness_nm / total_time_hrs if total_time_hrs > 0 else 0
+        view = self.current_view()
+        if len(view.series):
+            thickness_nm, growth_rate = growth_summary(view.series.time_max, view.peak_count, self.lattice_constant)
             
-            info_text = f"Layers: {self.peak_count} | Thickness: {thickness_nm:.2f} nm | Rate: {growth_rate:.1f} nm/hr"
+            info_text = (f"Layers: {format_layers(view.peak_count)} | Thickness: {thickness_nm:.2f} nm | "
+                         f"Rate: {growth_rate:.1f} nm/hr")
+            if view.layer_frequency:
+                info_text += f" | Now: {growth_rate_from_frequency(view.layer_frequency, self.lattice_constant):.1f} nm/hr"
             self.info_label.setText(info_text)
         else:
             self.info_label.setText('')
     
+    def toggle_instrumentation(self):
+        self.perf.enabled = not self.perf.enabled
+        if self.perf.enabled:
+            self.perf.reset()
+            self.perf_timer.start()
+        else:
+            self.perf_timer.stop()
+        self.perf_label.setVisible(self.perf.enabled)
+        self.update_perf_display()
+    
+    def update_perf_display(self):
+        summary = self.perf.summary()
+        stages, gauges = summary['stages'], summary['gauges']
+        parts = []
+        
+        # live samples are counted as they reach the GUI, file samples as they are measured
+        rate = (stages.get('sample') or stages.get('metric') or {}).get('rate_hz')
+        if rate:
+            parts.append(f"{rate:.1f} samples/s")
+        for name in ('metric', 'redraw', 'delivery'):
+            if name in stages and stages[name]['p95_ms'] is not None:
+                parts.append(f"{name} p95 {stages[name]['p95_ms']:.2f} ms")
+        view = self.current_view()
+        if view is not self and view.running:
+            ring = view.thread.ring
+            parts.append(f"queue {len(ring)}/{ring.capacity}")
+            parts.append(f"dropped {ring.dropped}")
+        self.perf_label.setText(' | '.join(parts))
+    
+    def export_trace(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, 'Export Trace', '', 
+                                                  'JSON Files (*.json);;CSV Files (*.csv);;All Files (*)')
+        if file_path:
+            try:
+                self.perf.export(file_path)
+            except OSError as e:
+                print(f"Error exporting trace: {e}")
+    
     def handle_export_import(self):
         if self.export_combo.currentText() == 'Export Data':
             self.export_data()
+        elif self.export_combo.currentText() == 'Export Trace':
+            self.export_trace()
         else:
             self.import_data()
     
     def import_data(self):
         file_path, _ = QFileDialog.getOpenFileName(self, 'Import Data', '', 
-                                                  'JSON Files (*.json);;All Files (*)')
+                                                  f'JSON Files (*.json);;CSV Files (*.csv);;Run Logs (*{LOG_EXTENSION});;All Files (*)')
         if file_path:
+            self.plot_tabs.setCurrentWidget(self.analysis_tab)
             try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
+                if file_path.endswith(LOG_EXTENSION):
+                    self.load_run_log(file_path)
+                    return
+                
+                data = import_series(file_path)
                 
-                self.time_points = data['time_points']
-                self.brightness_values = data['brightness_values']
-                self.peak_count = data['peak_count']
-                self.lattice_constant = data['lattice_constant']
+                values = data.get('region_values', data['brightness_values'])
+                self.series = TimeSeries.from_arrays(data['time_points'], values, copy=False)
+                self.region_names = data.get('region_names', [])
+                if data.get('peak_count') is None:
+                    self.peak_count = self.count_layers()
+                else:
+                    self.peak_count = data['peak_count']
+                    self.layer_frequency = None
+                self.lattice_constant = data.get('lattice_constant', self.lattice_spin.value())
                 self.lattice_spin.setValue(self.lattice_constant)
                 
                 self.canvas.plot_data(self)
@@ -687,58 +1383,130 @@ class RHEED(QMainWindow):
             except Exception as e:
                 print(f"Error importing data: {e}")
     
+    def start_run_log(self, source, columns=None):
+        self.close_run_log()
+        try:
+            self.run_log = RunLog.create(self.lattice_constant, source, self.run_log_dir, columns=columns or None)
+        except OSError as e:
+            print(f"Error creating run log: {e}")
+            self.run_log = None
+    
+    def close_run_log(self):
+        if self.run_log:
+            self.run_log.close(self.lattice_constant)
+            self.run_log = None
+            prune_closed_logs(self.run_log_dir)
+    
+    def load_run_log(self, file_path):
+        self.plot_tabs.setCurrentWidget(self.analysis_tab)
+        header, times, values = open_run_log(file_path)
+        self.series = TimeSeries.from_arrays(times, values, copy=False)
+        names = [region.name for region in self.regions]
+        columns = self.series.columns or 0
+        self.region_names = names if len(names) == columns else [f"Region {i + 1}" for i in range(columns)]
+        self.peak_count = self.count_layers()
+        self.lattice_constant = header['lattice_constant']
+        self.lattice_spin.setValue(self.lattice_constant)
+        
+        self.canvas.plot_data(self)
+        self.update_info_display()
+    
+    def offer_run_recovery(self):
+        unclosed = find_unclosed_logs(self.run_log_dir)
+        if not unclosed:
+            return
+        
+        # newest first, one at a time: a declined run is closed, a recovered one fills the analysis tab, and
+        # any not reached yet stay unclosed so they are offered again at the next start
+        buttons = QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel
+        for i, header in enumerate(unclosed):
+            started = time.strftime('%Y-%m-%d %H:%M', time.localtime(header['created']))
+            count = f" ({i + 1} of {len(unclosed)})" if len(unclosed) > 1 else ""
+            answer = QMessageBox.question(
+                self, f'Recover Run{count}',
+                f"The run started {started} from {header['source']} did not finish cleanly.\n"
+                f"Recover its {header['samples']} samples?", buttons)
+            if answer == QMessageBox.StandardButton.Cancel:
+                return
+            
+            mark_closed(header['path'])
+            if answer == QMessageBox.StandardButton.Yes:
+                try:
+                    self.load_run_log(header['path'])
+                except Exception as e:
+                    print(f"Error recovering run: {e}")
+                return
+    
+    def start_publisher(self, address=DEFAULT_ADDRESS, framing=JSON_FRAMING):
+        try:
+            self.publisher = SamplePublisher(address, framing)
+            print(f"Publishing live samples on {self.publisher.start()}")
+        except (OSError, ValueError) as e:
+            print(f"Error starting sample publisher: {e}")
+            self.publisher = None
+    
+    def closeEvent(self, event):
+        self.stop_live_analysis()
+        if self.publisher:
+            self.publisher.stop()
+        if self.device_thread and self.device_thread.isRunning():
+            self.device_thread.wait()
+        self.metric_pool.shutdown(wait=False)
+        if self.analysis_thread and self.analysis_thread.isRunning():
+            # stopping leaves the checkpoint in place so the analysis can resume next time
+            self.analysis_thread.stop()
+            self.analysis_thread.wait()
+        self.close_run_log()
+        super().closeEvent(event)
+    
     def export_data(self):
-        if not self.time_points:
+        # exports whatever the selected tab shows, so each live session is saved on its own
+        view = self.current_view()
+        if not len(view.series):
             return
             
         file_path, _ = QFileDialog.getSaveFileName(self, 'Export Data', '', 
                                                   'JSON Files (*.json);;CSV Files (*.csv);;All Files (*)')
-        if file_path:
-            total_time_hrs = max(self.time_points) / 3600 if self.time_points else 0
-            thickness_nm = (self.peak_count * self.lattice_constant) / 10
-            growth_rate = thickness_nm / total_time_hrs if total_time_hrs > 0 else 0
-            
-            if file_path.endswith('.json'):
-                data = {
-                    'time_points': self.time_points,
-                    'brightness_values': self.brightness_values,
-                    'peak_count': self.peak_count,
-                    'lattice_constant': self.lattice_constant,
-                    'thickness_nm': thickness_nm,
-                    'growth_rate_nm_per_hr': growth_rate
-                }
-                with open(file_path, 'w') as f:
-                    json.dump(data, f, indent=2)
-            else:
-                import csv
-                with open(file_path, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['Time (s)', 'Intensity'])
-                    for t, i in zip(self.time_points, self.brightness_values):
-                        writer.writerow([t, i])
+        if file_path and view is not self:
+            view.export(file_path)
+        elif file_path:
+            names = [region.name for region in self.regions]
+            regions = self.regions if names == self.region_names else self.region_names
+            export_series(file_path, self.time_points, self.series.values,
+                          self.peak_count, self.lattice_constant, regions)
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(prog='gandiva.py')
+    parser.add_argument('--no-splash', action='store_true', help='start without the splash screen')
+    parser.add_argument('--publish', nargs='?', const=DEFAULT_ADDRESS, default=os.environ.get('GANDIVA_PUBLISH'),
+                        metavar='ADDRESS', help=f"stream live samples on a local socket, tcp:HOST:PORT or unix:PATH "
+                                                f"(default: {DEFAULT_ADDRESS})")
+    parser.add_argument('--publish-framing', choices=FRAMINGS, default=JSON_FRAMING,
+                        help='newline-delimited JSON or fixed binary records')
+    options, qt_args = parser.parse_known_args()
+    
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle('Fusion')
     
+    splash = None
+    if not options.no_splash and os.environ.get('GANDIVA_NO_SPLASH') != '1':
+        splash = SplashScreen()
+        splash.show()
+        app.processEvents()
+    
     window = RHEED()
+    if options.publish:
+        window.start_publisher(options.publish, options.publish_framing)
     
     def show_main_window():
         window.showMaximized()
         window.raise_()
         window.activateWindow()
+        if splash:
+            splash.start_fadeout()
+        threading.Thread(target=preload_modules, daemon=True).start()
+        window.offer_run_recovery()
     
-    main_window_timer = QTimer()
-    main_window_timer.timeout.connect(show_main_window)
-    main_window_timer.setSingleShot(True)
-    main_window_timer.start(1000)
-    
-    splash = SplashScreen()
-    splash.show()
-    
-    def hide_splash():
-        splash.start_fadeout()
-    
-    splash.splash_finished.connect(hide_splash)
+    QTimer.singleShot(0, show_main_window)
     
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,169 @@
+import csv
+import json
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
+
+
+# latency histogram bins: 8 per decade from 1 us to 10 s
+HISTOGRAM_EDGES = np.logspace(-6, 1, 57)
+MAX_TRACE_EVENTS = 200000
+RATE_WINDOW = 64
+
+_NULL_STAGE = nullcontext()
+
+
+class StageStats:
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RATE_WINDOW)
+
+    def add(self, seconds, now):
+        self.counts[bisect_right(HISTOGRAM_EDGES, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(now)
+
+    def percentile(self, q):
+        # upper edge of the bin holding the q-th percentile; within 33% of the true value by construction
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.max, HISTOGRAM_EDGES[i]) if i < len(HISTOGRAM_EDGES) else self.max
+        return self.max
+
+    def rate(self):
+        if len(self.recent) < 2 or self.recent[-1] <= self.recent[0]:
+            return None
+        return (len(self.recent) - 1) / (self.recent[-1] - self.recent[0])
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else None,
+            'p50_ms': _ms(self.percentile(50)),
+            'p95_ms': _ms(self.percentile(95)),
+            'max_ms': self.max * 1000,
+            'rate_hz': self.rate()
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+class _Stage:
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.stages = {}
+        self.gauges = {}
+        self.trace = deque(maxlen=MAX_TRACE_EVENTS)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.origin = time.perf_counter()
+            self.stages = {}
+            self.gauges = {}
+            self.trace.clear()
+
+    def stage(self, name):
+        return _Stage(self, name) if self.enabled else _NULL_STAGE
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.add(seconds, now)
+            self.trace.append((now - self.origin, 'stage', name, seconds * 1000))
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.gauges.get(name) != value:
+                self.trace.append((time.perf_counter() - self.origin, 'gauge', name, value))
+            self.gauges[name] = value
+
+    def timed(self, name, func):
+        if not self.enabled:
+            return func
+
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def timed_iter(self, name, iterable):
+        # times how long each next() takes, such as decoding the next frame
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iter(iterable))
+
+    def _timed_iter(self, name, iterator):
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(name, time.perf_counter() - start)
+            yield item
+
+    def summary(self):
+        with self._lock:
+            return {
+                'stages': {name: stats.summary() for name, stats in self.stages.items()},
+                'gauges': dict(self.gauges)
+            }
+
+    def export(self, file_path):
+        summary = self.summary()
+        with self._lock:
+            events = list(self.trace)
+
+        if file_path.endswith('.json'):
+            with open(file_path, 'w') as f:
+                json.dump({
+                    'summary': summary,
+                    'events': [{'time_s': t, 'kind': kind, 'name': name, 'value': value}
+                               for t, kind, name, value in events]
+                }, f, indent=2)
+        else:
+            with open(file_path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Time (s)', 'Kind', 'Name', 'Value'])
+                writer.writerows(events)
@@ -0,0 +1,193 @@
+import numpy as np
+
+from series import TimeSeries
+
+
+LOD_FACTOR = 4
+SMOOTH_WINDOW = 11
+SMOOTH_ORDER = 3
+# bucket columns: time and value of the lowest sample, time and value of the highest
+T_MIN, V_MIN, T_MAX, V_MAX = range(4)
+
+
+class MinMaxPyramid:
+    # Multi-resolution min/max decimation of a growing series. Level k keeps one bucket per LOD_FACTOR**k
+    # samples holding the lowest and highest sample in it, so drawing the two extremes of each bucket keeps
+    # every peak and trough however far the view is zoomed out. Buckets are added as their samples complete,
+    # whole groups at a time, and a view only ever reads about two points per pixel.
+    def __init__(self, factor=LOD_FACTOR):
+        self.factor = factor
+        self.samples = TimeSeries()
+        self.levels = []
+
+    def __len__(self):
+        return len(self.samples)
+
+    def clear(self):
+        self.samples.clear()
+        self.levels = []
+
+    def extend(self, times, values):
+        self.samples.extend(times, values)
+        finer = None
+        level = 0
+        while True:
+            count = len(self.samples) if finer is None else len(finer)
+            if level == len(self.levels):
+                if count < self.factor:
+                    return
+                self.levels.append(TimeSeries(columns=4))
+            buckets = self.levels[level]
+            start = len(buckets) * self.factor
+            stop = start + (count - start) // self.factor * self.factor
+            if stop == start:
+                return
+            if finer is None:
+                self._merge_samples(buckets, start, stop)
+            else:
+                self._merge_buckets(buckets, finer, start, stop)
+            finer = buckets
+            level += 1
+
+    def _merge_samples(self, buckets, start, stop):
+        times = self.samples.times[start:stop].reshape(-1, self.factor)
+        values = self.samples.values[start:stop].reshape(-1, self.factor)
+        rows = np.arange(len(values))
+        low, high = np.argmin(values, axis=1), np.argmax(values, axis=1)
+        buckets.extend(times[:, 0], np.column_stack((times[rows, low], values[rows, low],
+                                                     times[rows, high], values[rows, high])))
+
+    def _merge_buckets(self, buckets, finer, start, stop):
+        groups = finer.values[start:stop].reshape(-1, self.factor, 4)
+        rows = np.arange(len(groups))
+        low, high = np.argmin(groups[:, :, V_MIN], axis=1), np.argmax(groups[:, :, V_MAX], axis=1)
+        buckets.extend(finer.times[start:stop:self.factor],
+                       np.column_stack((groups[rows, low, T_MIN], groups[rows, low, V_MIN],
+                                        groups[rows, high, T_MAX], groups[rows, high, V_MAX])))
+
+    def level_for(self, count, pixels):
+        # the finest level that draws the visible samples in at most one bucket per pixel
+        level, size = 0, 1
+        while level < len(self.levels) and count > pixels * size:
+            level += 1
+            size *= self.factor
+        return level
+
+    def view(self, x_min, x_max, pixels):
+        # the points to draw for [x_min, x_max] on an axis `pixels` wide, with one extra point either side
+        # so the line runs on past the edges
+        times = self.samples.times
+        if not len(times):
+            return np.empty(0), np.empty(0)
+        start = max(0, int(np.searchsorted(times, x_min, side='left')) - 1)
+        stop = min(len(times), int(np.searchsorted(times, x_max, side='right')) + 1)
+        return self._points(self.level_for(stop - start, max(1, int(pixels))), start, stop)
+
+    def _points(self, level, start, stop):
+        if level == 0 or stop <= start:
+            return self.samples.times[start:stop], self.samples.values[start:stop]
+
+        size = self.factor ** level
+        buckets = self.levels[level - 1].values
+        covered = len(buckets) * size
+        first, last = start // size, min(-(-stop // size), len(buckets))
+        chosen = buckets[first:last]
+        # each bucket's two extremes, in time order
+        swap = chosen[:, T_MIN] > chosen[:, T_MAX]
+        times = np.empty(2 * len(chosen))
+        values = np.empty(2 * len(chosen))
+        times[0::2] = np.where(swap, chosen[:, T_MAX], chosen[:, T_MIN])
+        times[1::2] = np.where(swap, chosen[:, T_MIN], chosen[:, T_MAX])
+        values[0::2] = np.where(swap, chosen[:, V_MAX], chosen[:, V_MIN])
+        values[1::2] = np.where(swap, chosen[:, V_MIN], chosen[:, V_MAX])
+        if stop <= covered:
+            return times, values
+
+        # samples past the last complete bucket come from the finer levels
+        tail_times, tail_values = self._points(level - 1, max(start, covered), stop)
+        return np.concatenate((times, tail_times)), np.concatenate((values, tail_values))
+
+
+class SmoothedPyramid:
+    # The pyramid of a series as the plot shows it: Savitzky-Golay smoothed, then scaled to 0-100%. A smoothed
+    # sample is final once SMOOTH_WINDOW // 2 samples follow it, so only the finished ones go into the
+    # pyramid and the last few are recomputed from the raw tail when drawn. The scaling is linear, so it is
+    # applied to the drawn points only.
+    def __init__(self, factor=LOD_FACTOR):
+        from scipy.signal import savgol_filter
+
+        self.pyramid = MinMaxPyramid(factor)
+        self.count = 0
+        self.tail = (np.empty(0), np.empty(0))
+        # row i smooths sample i of a SMOOTH_WINDOW-sample series; the middle row is the interior kernel
+        self.weights = savgol_filter(np.eye(SMOOTH_WINDOW), SMOOTH_WINDOW, SMOOTH_ORDER, axis=0)
+
+    def __len__(self):
+        return self.count
+
+    def update(self, times, values):
+        # `times` and `values` are the whole raw series so far; only what is new since the last call is read
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n < self.count:
+            self.pyramid.clear()
+        self.count = n
+
+        half = SMOOTH_WINDOW // 2
+        if n < SMOOTH_WINDOW:
+            self.pyramid.clear()
+            self.tail = (times, smooth(values))
+            return
+
+        done = len(self.pyramid)
+        final = n - half
+        if done < final:
+            parts = []
+            if done < half:
+                parts.append((self.weights[:half] @ values[:SMOOTH_WINDOW])[done:])
+            start = max(done, half)
+            parts.append(np.convolve(values[start - half:final + half], self.weights[half][::-1], 'valid'))
+            self.pyramid.extend(times[done:final], np.concatenate(parts))
+        self.tail = (times[final:], self.weights[-half:] @ values[-SMOOTH_WINDOW:])
+
+    def bounds(self):
+        samples = self.pyramid.samples
+        tail = self.tail[1]
+        lows = [samples.value_min] if len(samples) else []
+        highs = [samples.value_max] if len(samples) else []
+        if len(tail):
+            lows.append(float(np.min(tail)))
+            highs.append(float(np.max(tail)))
+        return (min(lows), max(highs)) if lows else (0.0, 0.0)
+
+    def normalize(self, values):
+        low, high = self.bounds()
+        if high > low:
+            return (values - low) / (high - low) * 100
+        return values * 0 + 50
+
+    def view(self, x_min, x_max, pixels):
+        times, values = self.pyramid.view(x_min, x_max, pixels)
+        tail_times, tail_values = self.tail
+        finished = self.pyramid.samples.times
+        if len(finished) and x_max < finished[-1]:
+            return times, self.normalize(values)
+        # the unfinished tail is a few samples at most, with one more either side of the view as above
+        start = max(0, int(np.searchsorted(tail_times, x_min, side='left')) - 1)
+        stop = min(len(tail_times), int(np.searchsorted(tail_times, x_max, side='right')) + 1)
+        if start < stop:
+            times = np.concatenate((times, tail_times[start:stop]))
+            values = np.concatenate((values, tail_values[start:stop]))
+        return times, self.normalize(values)
+
+    def full(self):
+        return self.view(-np.inf, np.inf, len(self) or 1)
+
+
+def smooth(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) > 3:
+        from scipy.signal import savgol_filter
+        return savgol_filter(values, window_length=min(SMOOTH_WINDOW, len(values)), polyorder=SMOOTH_ORDER)
+    return values
@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import selectors
+import socket
+import stat
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+PUBLISH_VERSION = 1
+JSON_FRAMING = 'json'
+BINARY_FRAMING = 'binary'
+FRAMINGS = (JSON_FRAMING, BINARY_FRAMING)
+DEFAULT_ADDRESS = 'tcp:127.0.0.1:5757'
+DEFAULT_CLIENT_BUFFER = 1024
+NO_DEVICE = 0xFFFF
+# session (device index), value count, time since start, wall clock, layers, rate in nm/hr; then the values
+BINARY_HEADER = struct.Struct('<HHdddd')
+
+
+def parse_address(address):
+    # "tcp:host:port" or "unix:/path/to/socket"
+    kind, sep, rest = address.partition(':')
+    if kind == 'unix' and rest:
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError("unix sockets are not available on this platform")
+        return socket.AF_UNIX, rest
+    if kind == 'tcp':
+        host, sep, port = rest.rpartition(':')
+        if sep and port.isdigit():
+            return socket.AF_INET, (host or '127.0.0.1', int(port))
+    raise ValueError(f"address {address!r} should look like tcp:127.0.0.1:5757 or unix:/tmp/gandiva.sock")
+
+
+def format_address(family, address):
+    if family == getattr(socket, 'AF_UNIX', None):
+        return f"unix:{address}"
+    return f"tcp:{address[0]}:{address[1]}"
+
+
+def remove_socket(path):
+    # removes a unix socket, refusing to touch a regular file or anything else given by mistake
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"{path} exists and is not a socket")
+    os.remove(path)
+
+
+def encode_sample(framing, session, device, time_point, brightness, layers, rate, wall=None):
+    wall = time.time() if wall is None else wall
+    values = np.atleast_1d(np.asarray(brightness, dtype=np.float64))
+    if framing == BINARY_FRAMING:
+        header = BINARY_HEADER.pack(device if isinstance(device, int) and 0 <= device < NO_DEVICE else NO_DEVICE,
+                                    len(values), time_point, wall, layers, rate)
+        return header + values.tobytes()
+    sample = {'session': session, 'time': time_point, 'wall': wall,
+              'brightness': float(values[0]) if np.ndim(brightness) == 0 else values.tolist(),
+              'layers': layers, 'rate_nm_per_hr': rate}
+    return (json.dumps(sample, separators=(',', ':')) + '\n').encode()
+
+
+class _Client:
+    __slots__ = ('sock', 'frames', 'pending', 'dropped', 'writing')
+
+    def __init__(self, sock, capacity):
+        self.sock = sock
+        self.frames = deque(maxlen=capacity)
+        self.pending = b''
+        self.dropped = 0
+        self.writing = False
+
+
+class SamplePublisher:
+    # Streams live samples to any number of local subscribers. publish() only encodes the sample once and
+    # appends it to each client's bounded queue, so it never waits on a socket; a client that falls more
+    # than client_buffer frames behind loses its oldest frames. Sockets are served by one thread.
+    def __init__(self, address=DEFAULT_ADDRESS, framing=JSON_FRAMING, client_buffer=DEFAULT_CLIENT_BUFFER,
+                 send_buffer=None):
+        if framing not in FRAMINGS:
+            raise ValueError(f"unknown framing {framing!r}, expected one of {FRAMINGS}")
+        self.family, self.bind_address = parse_address(address)
+        self.framing = framing
+        self.client_buffer = client_buffer
+        # SO_SNDBUF for each subscriber; a smaller kernel buffer makes a stalled client drop frames sooner
+        self.send_buffer = send_buffer
+        self.address = None
+        self.published = 0
+        self.dropped = 0
+        self.running = False
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._selector = None
+        self._listener = None
+        self._thread = None
+        self._wake_read = self._wake_write = None
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    def start(self):
+        if self.family != socket.AF_INET:
+            # a socket left behind by a run that did not shut down cleanly; anything else there is kept
+            remove_socket(self.bind_address)
+        listener = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_INET:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(self.bind_address)
+        listener.listen()
+        listener.setblocking(False)
+        self._listener = listener
+        self.address = format_address(self.family, listener.getsockname())
+
+        # made here and closed in stop(), so each start/stop cycle leaves no descriptors behind
+        self._wake_read, self._wake_write = socket.socketpair()
+        self._wake_read.setblocking(False)
+        self._wake_write.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(listener, selectors.EVENT_READ)
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+        self.running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._wake()
+        self._thread.join()
+        for client in list(self._clients.values()):
+            self._drop(client)
+        self._selector.close()
+        self._listener.close()
+        self._wake_read.close()
+        self._wake_write.close()
+        if self.family != socket.AF_INET:
+            try:
+                remove_socket(self.bind_address)
+            except (OSError, ValueError):
+                pass
+
+    def publish(self, session, device, time_point, brightness, layers, rate):
+        if not self._clients:
+            return
+        frame = encode_sample(self.framing, session, device, time_point, brightness, layers, rate)
+        with self._lock:
+            for client in self._clients.values():
+                if len(client.frames) == client.frames.maxlen:
+                    client.dropped += 1
+                    self.dropped += 1
+                client.frames.append(frame)
+            self.published += 1
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_write.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _serve(self):
+        while self.running:
+            for key, events in self._selector.select(timeout=0.5):
+                sock = key.fileobj
+                if sock is self._listener:
+                    self._accept()
+                elif sock is self._wake_read:
+                    try:
+                        while sock.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    client = key.data
+                    if events & selectors.EVENT_READ and not self._receive(client):
+                        continue
+                    if events & selectors.EVENT_WRITE:
+                        self._flush(client)
+            for client in list(self._clients.values()):
+                if not client.writing and (client.frames or client.pending):
+                    self._flush(client)
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except (BlockingIOError, OSError):
+            return
+        sock.setblocking(False)
+        if self.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.send_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)
+        client = _Client(sock, self.client_buffer)
+        hello = {'gandiva': PUBLISH_VERSION, 'framing': self.framing}
+        client.pending = (json.dumps(hello) + '\n').encode()
+        with self._lock:
+            self._clients[sock] = client
+        self._selector.register(sock, selectors.EVENT_READ, client)
+
+    def _receive(self, client):
+        # subscribers have nothing to say; a read only tells us they have gone
+        try:
+            if client.sock.recv(4096):
+                return True
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        self._drop(client)
+        return False
+
+    def _flush(self, client):
+        # frames leave the bounded queue only once the last batch is out, so a stalled client's backlog
+        # stays in the queue where the oldest frames are dropped
+        if not client.pending:
+            with self._lock:
+                client.pending = b''.join(client.frames)
+                client.frames.clear()
+        try:
+            sent = client.sock.send(client.pending) if client.pending else 0
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(client)
+            return
+        client.pending = client.pending[sent:]
+
+        writing = bool(client.pending)
+        if writing != client.writing:
+            client.writing = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self._selector.modify(client.sock, events, client)
+
+    def _drop(self, client):
+        with self._lock:
+            self._clients.pop(client.sock, None)
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+
+def subscribe(address=DEFAULT_ADDRESS, timeout=None):
+    # reference client: connects to a running publisher and yields each sample as a dict
+    family, target = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(target)
+    if family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    with sock, sock.makefile('rb') as stream:
+        hello = json.loads(stream.readline())
+        if hello.get('framing') == BINARY_FRAMING:
+            while True:
+                header = stream.read(BINARY_HEADER.size)
+                if len(header) < BINARY_HEADER.size:
+                    return
+                device, count, time_point, wall, layers, rate = BINARY_HEADER.unpack(header)
+                values = np.frombuffer(stream.read(8 * count), dtype=np.float64)
+                yield {'device': None if device == NO_DEVICE else device, 'time': time_point, 'wall': wall,
+                       'brightness': float(values[0]) if count == 1 else values.tolist(),
+                       'layers': layers, 'rate_nm_per_hr': rate}
+        else:
+            for line in stream:
+                yield json.loads(line)
+
+
+def main(argv=None, prog='gandiva.py listen'):
+    parser = argparse.ArgumentParser(prog=prog, description='Print live samples published by a running Gandiva.')
+    parser.add_argument('address', nargs='?', default=DEFAULT_ADDRESS,
+                        help=f"tcp:HOST:PORT or unix:PATH (default: {DEFAULT_ADDRESS})")
+    args = parser.parse_args(argv)
+    try:
+        for sample in subscribe(args.address):
+            # wall clock latency from publishing to here
+            sample['latency_ms'] = (time.time() - sample['wall']) * 1000
+            print(json.dumps(sample), flush=True)
+    except (OSError, ValueError) as e:
+        print(f"Error reading from {args.address}: {e}")
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(prog='publisher.py'))
@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+
+
+RECT = 'rect'
+POLYGON = 'polygon'
+
+
+class Region:
+    def __init__(self, name, shape, points):
+        if shape == RECT:
+            x, y, w, h = (int(v) for v in points)
+            if w <= 0 or h <= 0:
+                raise ValueError(f"region {name!r} must have a positive width and height")
+            points = (x, y, w, h)
+            x0, y0, x1, y1 = x, y, x + w, y + h
+        elif shape == POLYGON:
+            points = tuple((int(px), int(py)) for px, py in points)
+            if len(points) < 3:
+                raise ValueError(f"polygon region {name!r} needs at least 3 points")
+            xs, ys = zip(*points)
+            x0, y0, x1, y1 = min(xs), min(ys), max(xs) + 1, max(ys) + 1
+        else:
+            raise ValueError(f"unknown region shape {shape!r}, expected {RECT!r} or {POLYGON!r}")
+        if x0 < 0 or y0 < 0:
+            raise ValueError(f"region {name!r} must lie inside the frame")
+
+        self.name = name
+        self.shape = shape
+        self.points = points
+        self.bounds = (x0, y0, x1, y1)
+        self._mask = None
+
+    @classmethod
+    def parse(cls, spec):
+        # "name=x,y,w,h" for a rectangle, "name=x1,y1;x2,y2;x3,y3..." for a polygon
+        name, sep, coords = spec.partition('=')
+        name = name.strip()
+        if not sep or not name:
+            raise ValueError(f"region {spec!r} should look like name=x,y,w,h or name=x1,y1;x2,y2;x3,y3")
+        try:
+            if ';' in coords:
+                points = [[float(v) for v in point.split(',')] for point in coords.split(';') if point.strip()]
+                if any(len(point) != 2 for point in points):
+                    raise ValueError
+                return cls(name, POLYGON, points)
+            values = [float(v) for v in coords.split(',')]
+            if len(values) != 4:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"could not read the coordinates of region {spec!r}")
+        return cls(name, RECT, values)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['shape'], data['points'])
+
+    def to_dict(self):
+        points = [list(p) for p in self.points] if self.shape == POLYGON else list(self.points)
+        return {'name': self.name, 'shape': self.shape, 'points': points}
+
+    def __str__(self):
+        if self.shape == RECT:
+            return f"{self.name}=" + ','.join(str(v) for v in self.points)
+        return f"{self.name}=" + ';'.join(f"{x},{y}" for x, y in self.points)
+
+    def __repr__(self):
+        return f"Region({str(self)!r})"
+
+    def crop(self, frame):
+        # a view into the frame, clipped at its edges; nothing is copied
+        x0, y0, x1, y1 = self.bounds
+        return frame[y0:y1, x0:x1]
+
+    def mask_for(self, crop):
+        if self.shape == RECT:
+            return None
+        if self._mask is None:
+            x0, y0, x1, y1 = self.bounds
+            self._mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+            polygon = np.array(self.points, dtype=np.int32) - (x0, y0)
+            cv2.fillPoly(self._mask, [polygon], 1)
+        return self._mask[:crop.shape[0], :crop.shape[1]]
+
+
+def parse_regions(text):
+    regions = [Region.parse(line) for line in text.splitlines() if line.strip()]
+    names = [region.name for region in regions]
+    if len(set(names)) != len(names):
+        raise ValueError("region names must be unique")
+    return regions
@@ -0,0 +1,209 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+
+MAGIC = b'GNDVRLOG'
+VERSION = 2
+HEADER = struct.Struct('<8sHBBddH226s')
+HEADER_SIZE = HEADER.size
+RECORD = np.dtype([('time', '<f8'), ('brightness', '<f8')])
+MAX_COLUMNS = 255
+LOG_EXTENSION = '.rlog'
+DEFAULT_FLUSH_INTERVAL = 0.5
+MAX_CLOSED_LOGS = 50
+
+
+def default_run_dir():
+    return os.path.join(os.path.expanduser('~'), '.gandiva', 'runs')
+
+
+def record_dtype(columns=None):
+    # one brightness per sample, or one per region when the run measured several
+    if not columns:
+        return RECORD
+    return np.dtype([('time', '<f8'), ('brightness', '<f8', (columns,))])
+
+
+def _pack_header(lattice_constant, created, source, closed, columns=None):
+    encoded = source.encode('utf-8')[:226]
+    return HEADER.pack(MAGIC, VERSION, 1 if closed else 0, columns or 0, lattice_constant, created,
+                       len(encoded), encoded)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{path} is too short to be a run log")
+
+    magic, version, closed, columns, lattice_constant, created, source_length, source = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a run log")
+    if version > VERSION:
+        raise ValueError(f"{path} was written by a newer version (format {version})")
+
+    # version 1 logs left this byte zero and always held a single column
+    columns = columns or None
+    size = os.path.getsize(path)
+    return {
+        'path': path,
+        'closed': bool(closed),
+        'columns': columns,
+        'lattice_constant': lattice_constant,
+        'created': created,
+        'source': source[:source_length].decode('utf-8', errors='replace'),
+        'samples': (size - HEADER_SIZE) // record_dtype(columns).itemsize
+    }
+
+
+def open_run_log(path):
+    header = read_header(path)
+    dtype = record_dtype(header['columns'])
+    if not header['samples']:
+        empty = np.empty(0, dtype=dtype)
+        return header, empty['time'], empty['brightness']
+
+    # a crash can leave a partial trailing record; the memory map simply stops before it
+    records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(header['samples'],))
+    return header, records['time'], records['brightness']
+
+
+def mark_closed(path):
+    header = read_header(path)
+    with open(path, 'r+b') as f:
+        f.write(_pack_header(header['lattice_constant'], header['created'], header['source'], True,
+                             header['columns']))
+
+
+def find_unclosed_logs(directory=None):
+    directory = directory or default_run_dir()
+    if not os.path.isdir(directory):
+        return []
+
+    unclosed = []
+    for name in os.listdir(directory):
+        if not name.endswith(LOG_EXTENSION):
+            continue
+        try:
+            header = read_header(os.path.join(directory, name))
+        except (OSError, ValueError):
+            continue
+        if not header['closed']:
+            unclosed.append(header)
+
+    return sorted(unclosed, key=lambda h: h['created'], reverse=True)
+
+
+def prune_closed_logs(directory=None, keep=MAX_CLOSED_LOGS):
+    directory = directory or default_run_dir()
+    if not os.path.isdir(directory):
+        return
+
+    closed = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.endswith(LOG_EXTENSION):
+            continue
+        try:
+            header = read_header(path)
+        except (OSError, ValueError):
+            continue
+        if header['closed']:
+            closed.append(header)
+
+    closed.sort(key=lambda h: h['created'], reverse=True)
+    for header in closed[keep:]:
+        try:
+            os.remove(header['path'])
+        except OSError:
+            pass
+
+
+class RunLog:
+    def __init__(self, path, lattice_constant, source='', flush_interval=DEFAULT_FLUSH_INTERVAL, columns=None,
+                 created=None, samples=0):
+        if columns and columns > MAX_COLUMNS:
+            raise ValueError(f"a run log holds at most {MAX_COLUMNS} columns")
+        self.path = path
+        self.lattice_constant = lattice_constant
+        self.source = source
+        self.created = created or time.time()
+        self.flush_interval = flush_interval
+        self.columns = columns
+        self.samples = samples
+        self._dtype = record_dtype(columns)
+        self._record = struct.Struct('<d' + 'd' * (columns or 1))
+        self._last_flush = time.monotonic()
+
+        if samples:
+            # continuing an existing log: drop any torn trailing record, then append after the last whole one
+            self._file = open(path, 'r+b')
+            self._file.truncate(HEADER_SIZE + samples * self._dtype.itemsize)
+        else:
+            self._file = open(path, 'wb')
+        self._file.write(_pack_header(lattice_constant, self.created, source, False, columns))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+    @classmethod
+    def create(cls, lattice_constant, source='', directory=None, **kwargs):
+        directory = directory or default_run_dir()
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(directory, f"run-{stamp}{LOG_EXTENSION}")
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(directory, f"run-{stamp}-{suffix}{LOG_EXTENSION}")
+            suffix += 1
+        return cls(path, lattice_constant, source, **kwargs)
+
+    @classmethod
+    def reopen(cls, path, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        header = read_header(path)
+        return cls(path, header['lattice_constant'], header['source'], flush_interval, header['columns'],
+                   header['created'], header['samples'])
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def append(self, time_point, brightness):
+        if self.columns:
+            self._file.write(self._record.pack(time_point, *brightness))
+        else:
+            self._file.write(self._record.pack(time_point, brightness))
+        self.samples += 1
+        self._maybe_flush()
+
+    def extend(self, times, values):
+        records = np.empty(len(times), dtype=self._dtype)
+        records['time'] = times
+        records['brightness'] = values
+        self._file.write(records.tobytes())
+        self.samples += len(records)
+        self._maybe_flush()
+
+    def flush(self):
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def close(self, lattice_constant=None):
+        if self._file is None:
+            return
+        if lattice_constant is not None:
+            self.lattice_constant = lattice_constant
+
+        self._file.flush()
+        self._file.seek(0)
+        self._file.write(_pack_header(self.lattice_constant, self.created, self.source, True, self.columns))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
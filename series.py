@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class TimeSeries:
+    def __init__(self, capacity=1024, columns=None):
+        # columns=None stores one value per sample; columns=k stores a row of k values, one per region
+        self.columns = columns
+        self._times = np.empty(max(1, capacity))
+        self._values = np.empty(self._shape(max(1, capacity)))
+        self._n = 0
+        self._reset_extrema()
+
+    @classmethod
+    def from_arrays(cls, times, values, copy=True):
+        # copy=False adopts read-only or strided views such as memory-mapped columns as they are; otherwise
+        # the series owns a copy even when the input is already contiguous float64
+        if copy:
+            times = np.array(times, dtype=np.float64, order='C', copy=True)
+            values = np.array(values, dtype=np.float64, order='C', copy=True)
+        else:
+            times = np.asarray(times, dtype=np.float64)
+            values = np.asarray(values, dtype=np.float64)
+        if times.ndim != 1 or values.ndim not in (1, 2) or len(times) != len(values):
+            raise ValueError("times must be 1-D and values 1-D or 2-D, with the same length")
+
+        series = cls(capacity=0, columns=values.shape[1] if values.ndim == 2 else None)
+        if len(times):
+            # the arrays are adopted without copying; capacity is exactly full, so the next append reallocates
+            series._times = times
+            series._values = values
+            series._n = len(times)
+            series._update_extrema(times, values)
+        return series
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def capacity(self):
+        return len(self._times)
+
+    @property
+    def nbytes(self):
+        return self._times.nbytes + self._values.nbytes
+
+    def _shape(self, capacity):
+        return (capacity,) if self.columns is None else (capacity, self.columns)
+
+    @property
+    def times(self):
+        return self._times[:self._n]
+
+    @property
+    def values(self):
+        return self._values[:self._n]
+
+    def column(self, index):
+        return self.values if self.columns is None else self.values[:, index]
+
+    def append(self, time_point, value):
+        if self._n == len(self._times):
+            self._grow(self._n + 1)
+
+        self._times[self._n] = time_point
+        self._values[self._n] = value
+        self._n += 1
+
+        if self.columns is not None:
+            self._update_extrema(time_point, value)
+        elif self._n == 1:
+            self.time_min = self.time_max = time_point
+            self.value_min = self.value_max = value
+        else:
+            self.time_min = min(self.time_min, time_point)
+            self.time_max = max(self.time_max, time_point)
+            self.value_min = min(self.value_min, value)
+            self.value_max = max(self.value_max, value)
+
+    def extend(self, times, values):
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != self._shape(len(times)):
+            raise ValueError("times and values must have the same length")
+        if not len(times):
+            return
+
+        end = self._n + len(times)
+        if end > len(self._times):
+            self._grow(end)
+
+        self._times[self._n:end] = times
+        self._values[self._n:end] = values
+        self._n = end
+        self._update_extrema(times, values)
+
+    def clear(self):
+        self._n = 0
+        self._reset_extrema()
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self._times))
+        for name in ('_times', '_values'):
+            old = getattr(self, name)
+            new = np.empty(capacity if name == '_times' else self._shape(capacity))
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def _reset_extrema(self):
+        self.time_min = self.time_max = None
+        self.value_min = self.value_max = None
+
+    def _update_extrema(self, times, values):
+        batch = (float(np.min(times)), float(np.max(times)), float(np.min(values)), float(np.max(values)))
+        if self.time_min is None:
+            self.time_min, self.time_max, self.value_min, self.value_max = batch
+        else:
+            self.time_min = min(self.time_min, batch[0])
+            self.time_max = max(self.time_max, batch[1])
+            self.value_min = min(self.value_min, batch[2])
+            self.value_max = max(self.value_max, batch[3])
@@ -0,0 +1,244 @@
+import numpy as np
+
+
+MIN_SPECTRAL_SAMPLES = 32
+ZERO_PAD = 8
+WELCH_MIN_PERIODS = 16
+WELCH_SEGMENT_PERIODS = 8
+TRACK_PERIODS = 4
+TRACK_OVERLAP = 0.75
+DEFAULT_WINDOW = 1024
+# bins either side of the peak kept by the sliding update, and how often the band may move between windows
+TRACK_BAND = 8
+RELOCATE_DIVISOR = 8
+
+
+def sample_rate(time_points, n):
+    if time_points is None or len(time_points) < 2:
+        return 1.0
+    span = float(time_points[-1] - time_points[0])
+    return (len(time_points) - 1) / span if span > 0 else 1.0
+
+
+def _padded_length(n):
+    return 1 << int(np.ceil(np.log2(n * ZERO_PAD)))
+
+
+def _interpolated_peak(power, lowest):
+    # parabolic fit through the strongest bin and its neighbours, in bins
+    k = lowest + int(np.argmax(power[lowest:]))
+    if k <= 0 or k >= len(power) - 1:
+        return float(k)
+    left, centre, right = power[k - 1], power[k], power[k + 1]
+    denominator = left - 2 * centre + right
+    return k + (0.5 * (left - right) / denominator if denominator else 0.0)
+
+
+def _periodogram_frequency(detrended, fs):
+    # Hann-windowed, zero-padded periodogram; anything slower than one cycle per record is trend residue
+    n = len(detrended)
+    nfft = _padded_length(n)
+    power = np.abs(np.fft.rfft(detrended * np.hanning(n), nfft)) ** 2
+    return _interpolated_peak(power, nfft // n) * fs / nfft
+
+
+def dominant_frequency(brightness_values, time_points=None):
+    # frequency in Hz of the strongest oscillation; long records are averaged over Welch segments of a few
+    # periods each, which trades resolution the estimate no longer needs for robustness against noise
+    from scipy import signal
+
+    values = np.asarray(brightness_values, dtype=np.float64)
+    n = len(values)
+    if n < MIN_SPECTRAL_SAMPLES:
+        return 0.0
+
+    fs = sample_rate(time_points, n)
+    detrended = signal.detrend(values, type='linear')
+    frequency = _periodogram_frequency(detrended, fs)
+    if frequency <= 0 or frequency * n / fs < WELCH_MIN_PERIODS:
+        return frequency
+
+    nperseg = int(round(WELCH_SEGMENT_PERIODS * fs / frequency))
+    nfft = _padded_length(nperseg)
+    _, power = signal.welch(detrended, fs, window='hann', nperseg=nperseg, nfft=nfft, detrend='linear')
+    return _interpolated_peak(power, nfft // nperseg) * fs / nfft
+
+
+def spectral_layer_count(brightness_values, time_points=None):
+    # fractional number of oscillations: the dominant frequency times the length of the run
+    n = len(brightness_values)
+    if n < MIN_SPECTRAL_SAMPLES:
+        return 0.0
+    return float(dominant_frequency(brightness_values, time_points) * n / sample_rate(time_points, n))
+
+
+def frequency_track(brightness_values, time_points=None, periods=TRACK_PERIODS, overlap=TRACK_OVERLAP):
+    # the oscillation frequency over time, from windows a few dominant periods long; returns the window
+    # centres and the frequency found in each
+    from scipy import signal
+
+    values = np.asarray(brightness_values, dtype=np.float64)
+    n = len(values)
+    frequency = dominant_frequency(values, time_points)
+    if frequency <= 0:
+        return np.empty(0), np.empty(0)
+
+    fs = sample_rate(time_points, n)
+    times = np.arange(n) / fs if time_points is None else np.asarray(time_points, dtype=np.float64)
+    window = max(MIN_SPECTRAL_SAMPLES, int(round(periods * fs / frequency)))
+    if window >= n:
+        return times[n // 2:n // 2 + 1], np.array([frequency])
+
+    hop = max(1, int(window * (1 - overlap)))
+    starts = range(0, n - window + 1, hop)
+    centres = np.array([times[start + window // 2] for start in starts])
+    frequencies = np.array([_periodogram_frequency(signal.detrend(values[start:start + window]), fs)
+                            for start in starts])
+    return centres, frequencies
+
+
+def growth_rate_from_frequency(frequency_hz, lattice_constant):
+    # one oscillation per monolayer, lattice constant in Å, rate in nm/hr
+    return frequency_hz * 3600 * lattice_constant / 10
+
+
+class SlidingSpectrum:
+    # Sliding DFT over the last `window` samples, kept only for the few bins around the spectral peak: each
+    # tracked bin is rotated and corrected by the sample entering and the one leaving, so an update costs
+    # O(TRACK_BAND) however long the window or the run. The window's least-squares line is kept as running
+    # sums and its (precomputed) spectrum subtracted before picking the peak, the same detrending the offline
+    # estimate does. The whole spectrum is recomputed exactly with an FFT once per window, which clears the
+    # rounding error of the recursion and re-centres the band on the peak, and sooner when the peak reaches
+    # the edge of the band, at most every window / RELOCATE_DIVISOR samples: O(log window) per sample
+    # amortized. Until the window first fills, the batch estimate is redone only at geometrically growing
+    # lengths and extrapolated in between.
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self._buffer = np.zeros(window)
+        self._position = 0
+        self.n = 0
+        bins = np.arange(window // 2 + 1)
+        self._twiddle = np.exp(2j * np.pi * bins / window)
+        index = np.arange(window, dtype=np.float64)
+        self._ramp = np.fft.rfft(index - (window - 1) / 2)
+        self._ramp_norm = np.sum((index - (window - 1) / 2) ** 2)
+        # tracked bins lo..hi-1; the Hann-windowed power is only formed for the ones inside that range
+        self._lo = self._hi = 0
+        self._bins = np.zeros(0, dtype=np.complex128)
+        self._power = None
+        self._relocate = False
+        self._last_exact = 0
+        self._sum_y = 0.0
+        self._sum_iy = 0.0
+        self._interval = None
+        self._last_time = None
+        self._next_estimate = MIN_SPECTRAL_SAMPLES
+        self._warmup_cycles = 0.0
+        self.layers = 0.0
+        self.frequency = None
+
+    def __len__(self):
+        return self.n
+
+    def reset(self):
+        self.__init__(self.window)
+
+    def extend(self, values, time_points=None):
+        for i, value in enumerate(values):
+            self.update(value, None if time_points is None else time_points[i])
+        return self.layers
+
+    def update(self, value, time_point=None):
+        window = self.window
+        old = self._buffer[self._position]
+        self._buffer[self._position] = value
+        self._position = (self._position + 1) % window
+        self.n += 1
+
+        # every sample moves one place towards the oldest end of the window
+        self._sum_iy += (window - 1) * value - (self._sum_y - old)
+        self._sum_y += value - old
+        self._bins += value - old
+        self._bins *= self._twiddle[self._lo:self._hi]
+
+        if time_point is not None:
+            if self._last_time is not None and time_point > self._last_time:
+                step = time_point - self._last_time
+                weight = 1 / min(self.n, window)
+                self._interval = step if self._interval is None else self._interval + weight * (step - self._interval)
+            self._last_time = time_point
+
+        if self.n < window:
+            # until the window fills, the batch estimate on what has arrived so far, redone every 1/8 longer
+            if self.n >= self._next_estimate:
+                self._warmup_cycles = spectral_layer_count(self._buffer[:self.n]) / self.n
+                self._next_estimate = max(self.n + 1, self.n * 9 // 8)
+            self.layers = self._warmup_cycles * self.n
+            if self.layers:
+                self.frequency = self._warmup_cycles / (self._interval or 1.0)
+            return self.layers
+
+        if self.n % window == 0:
+            self._exact(recentre=False)
+        elif self._relocate and self.n - self._last_exact >= window // RELOCATE_DIVISOR:
+            self._exact(recentre=True)
+
+        cycles = self._cycles_per_sample()
+        if self.n == window:
+            # the first windowed estimate also covers the samples it took to fill the window
+            self.layers = cycles * (self.n - 1)
+        self.layers += cycles
+        self.frequency = cycles / (self._interval or 1.0)
+        return self.layers
+
+    def _exact(self, recentre):
+        window = self.window
+        ordered = np.roll(self._buffer, -self._position)
+        spectrum = np.fft.rfft(ordered)
+        self._sum_y = float(np.sum(ordered))
+        self._sum_iy = float(np.arange(window) @ ordered)
+        self._last_exact = self.n
+        self._relocate = False
+
+        # bin k's windowed power is at index k - 1; bins 0 and 1 are the mean and trend residue
+        power = self._hann_power(spectrum - self._slope() * self._ramp)
+        peak = 2 + int(np.argmax(power[1:]))
+        if self._power is not None and not recentre and self._lo + 1 < peak < self._hi - 2:
+            self._bins = spectrum[self._lo:self._hi].copy()
+            return
+
+        lo = max(0, peak - TRACK_BAND - 1)
+        hi = min(len(spectrum), peak + TRACK_BAND + 2)
+        smoothed = power[lo:hi - 2].copy()
+        if self._power is not None:
+            # bins that stay in the band keep their averaged power
+            keep_lo, keep_hi = max(lo, self._lo), min(hi, self._hi)
+            if keep_lo < keep_hi - 2:
+                smoothed[keep_lo - lo:keep_hi - 2 - lo] = self._power[keep_lo - self._lo:keep_hi - 2 - self._lo]
+        self._lo, self._hi = lo, hi
+        self._bins = spectrum[lo:hi].copy()
+        self._power = smoothed
+
+    def _slope(self):
+        window = self.window
+        return (self._sum_iy - (window - 1) / 2 * self._sum_y) / self._ramp_norm
+
+    @staticmethod
+    def _hann_power(bins):
+        # Hann window applied as a three-tap filter across the bins; one value per bin but the outermost two
+        hann = 0.5 * bins[1:-1] - 0.25 * (bins[:-2] + bins[2:])
+        return hann.real ** 2 + hann.imag ** 2
+
+    def _cycles_per_sample(self):
+        lo = self._lo
+        power = self._hann_power(self._bins - self._slope() * self._ramp[lo:self._hi])
+        # the power averaged over about a quarter window of updates, the running equivalent of Welch's method
+        self._power += (power - self._power) * (4 / self.window)
+        # nothing below bin 2: bin 0 is the mean and bin 1 what is left of any curvature in the trend
+        lowest = max(0, 1 - lo)
+        peak = _interpolated_peak(np.log(self._power + 1e-300), lowest)
+        edge = int(round(peak))
+        if (edge <= lowest and lo > 0) or (edge >= len(power) - 1 and self._hi < len(self._twiddle)):
+            # the peak has reached the edge of the band and may lie beyond it
+            self._relocate = True
+        return (lo + 1 + peak) / self.window